@@ -1,7 +1,10 @@
 from .quantize import quantize
 from .flush import flush
 from .histogram import histogram
+from .apply_lut import apply_lut
+from .enhancement_luts import enhancement_luts
 from .histogram_enhancement import histogram_enhancement
+from .histogram_enhancer import HistogramEnhancer
 from .dimensions import dimensions
 from .otsu import otsu_threshold
 from .quickplot import quickplot
@@ -10,14 +13,24 @@ from .constants import *
 from .map_rotation_scale import map_rotation_scale
 from .points import PointsSelected
 from .map_quad_to_quad import map_quad_to_quad
+from .map_gcp import map_gcp
+from .remap import remap
+from .convert_maps import convert_maps
+from .warp_map_cache import WarpMapCache
+from .workspace import Workspace
+from .border import border_interpolate,copy_make_border
 from .filter2D import filter2D
 from .fast import fast
+from .harris import harris
+from .filter_bank import FilterBank,TransferFunction,default_filter_bank
 from .filter_lowpass import filter_lowpass
 from .filter_highpass import filter_highpass
 from .filter_bandreject import filter_bandreject
 from .filter_bandpass import filter_bandpass
 from .filter_notchreject import filter_notchreject
 from .filter_notchpass import filter_notchpass
+from .fft_backend import FFTBackend
 from .frequency_filter import frequency_filter
+from .frequency_filter_tiled import frequency_filter_tiled,frequency_filter_tiles
 # from .fft_display import fft_display
 from .ImageViewer import *
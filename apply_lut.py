@@ -0,0 +1,86 @@
+import numpy as np
+import ipcv
+
+# pixels mapped per pass, bounds the memory held by the table indices
+_STRIP_PIXELS = 1 << 16
+
+
+def apply_lut(src, lut, out=None, axis=-1):
+	"""
+	:purpose:
+		maps an integer image through a lookup table, dst = lut[src]
+
+		the table is converted once to the dtype of the output (clipped to
+		its range) and applied with np.take directly into 'out', so no
+		full-frame index or floating point temporaries are created, a
+		stack of tables (one per band) is applied in the same single pass
+		by offsetting the indices of every band into the flattened tables
+	:inputs:
+		src [np.ndarray]
+			'--> integer image, values beyond the table are clipped to it
+		lut [np.ndarray]
+			'--> (levels) table for every pixel, or (n, levels) tables, the
+				 i-th of which maps the pixels of index i along 'axis'
+				 (e.g. the bands)
+		out [np.ndarray]
+			'--> optional output array with the shape of 'src' (may be
+				 'src' itself), a new array in the dtype of 'lut' when None
+		axis [int]
+			'--> axis of 'src' indexed by the stack of tables
+	:return:
+		mapped image [np.ndarray] ('out' if provided)
+	"""
+
+	#ERROR CHECKING
+	ipcv.type_check(src,(np.ndarray,),"src")
+	ipcv.type_check(lut,(np.ndarray,),"lut")
+	ipcv.value_check(np.issubdtype(src.dtype, np.integer),True,'e',"integer 'src'")
+	ipcv.value_check(src.ndim,(1,":"),'b',"src.ndim")
+	ipcv.value_check(lut.ndim,(1,2),'d',"lut.ndim")
+	if out is None:
+		out = np.empty(src.shape, dtype=lut.dtype)
+	ipcv.type_check(out,(np.ndarray,),"out")
+	ipcv.value_check(out.shape,(src.shape,),'d',"out.shape")
+	if lut.ndim == 2:
+		axis = axis % src.ndim
+		ipcv.value_check(lut.shape[0],src.shape[axis],'e',"lut.shape[0]")
+
+	try:
+		#the tables in the output dtype
+		table = lut
+		if table.dtype != out.dtype:
+			if np.issubdtype(out.dtype, np.integer):
+				limits = np.iinfo(out.dtype)
+				table = np.clip(table, limits.min, limits.max)
+			table = table.astype(out.dtype)
+		levels = table.shape[-1]
+		table = table.ravel()
+
+		direct = out.flags.c_contiguous and not np.shares_memory(src, out)
+		if lut.ndim == 1 and direct:
+			return np.take(table, src, out=out, mode='clip')
+
+		#offset of every table into the flattened tables
+		offsets = 0
+		if lut.ndim == 2:
+			shape = [1] * src.ndim
+			shape[axis] = lut.shape[0]
+			offsets = (np.arange(lut.shape[0], dtype=np.intp) * levels).reshape(shape)
+
+		stripRows = max(1, _STRIP_PIXELS // max(1, src[0].size))
+		for top in range(0, src.shape[0], stripRows):
+			bottom = min(top + stripRows, src.shape[0])
+			index = src[top:bottom].astype(np.intp)
+			if lut.ndim == 2:
+				#clipping to its own table before offsetting into the stack
+				np.clip(index, 0, levels - 1, out=index)
+				index += offsets[top:bottom] if axis == 0 else offsets
+			if direct:
+				np.take(table, index, out=out[top:bottom], mode='clip')
+			else:
+				out[top:bottom] = np.take(table, index, mode='clip')
+
+		return out
+
+	except Exception as e:
+		ipcv.debug(e)
@@ -0,0 +1,121 @@
+import numpy as np
+import ipcv
+
+
+def border_interpolate(p, length, borderType):
+	"""
+	:purpose:
+		maps coordinates that fall outside of [0, length) back onto valid
+		coordinates according to the border type (vectorized equivalent of
+		cv2.borderInterpolate)
+	:inputs:
+		p [int, np.ndarray]
+			'--> coordinates to map
+		length [int]
+			'--> number of pixels along the axis
+		borderType [int]
+			'--> one of the ipcv.BORDER_* constants
+	:return:
+		mapped coordinates [np.ndarray], out of range coordinates are set
+		to -1 for ipcv.BORDER_CONSTANT
+	"""
+	p = np.asarray(p)
+
+	if borderType == ipcv.BORDER_REPLICATE:
+		return np.clip(p, 0, length-1)
+
+	elif borderType == ipcv.BORDER_WRAP:
+		return p % length
+
+	elif borderType == ipcv.BORDER_REFLECT:
+		p = p % (2*length)
+		return np.where(p >= length, 2*length - 1 - p, p)
+
+	elif borderType == ipcv.BORDER_REFLECT_101:
+		if length == 1:
+			return np.zeros_like(p)
+		period = 2*length - 2
+		p = p % period
+		return np.where(p >= length, period - p, p)
+
+	elif borderType == ipcv.BORDER_CONSTANT:
+		return np.where( (p < 0) | (p >= length), -1, p )
+
+
+def copy_make_border(src, top, bottom, left, right, borderType=ipcv.BORDER_CONSTANT, value=0, dst=None, axes=(0,1)):
+	"""
+	:purpose:
+		pads an image with a border (equivalent of cv2.copyMakeBorder)
+
+		the image is copied into the center of 'dst' once and the borders
+		are filled from it, so a preallocated 'dst' can be reused between
+		calls without any further allocation of full frames
+	:inputs:
+		src [np.ndarray]
+			'--> image to pad
+		top, bottom, left, right [int]
+			'--> border widths in pixels
+		borderType [int]
+			'--> one of the ipcv.BORDER_* constants
+		value [int, float]
+			'--> border value used for ipcv.BORDER_CONSTANT
+		dst [np.ndarray]
+			'--> optional output buffer of the padded shape
+		axes [tuple]
+			'--> the (row, column) axes of 'src'
+	:return:
+		padded image [np.ndarray]
+	"""
+	ipcv.type_check(src,(np.ndarray,),"src")
+	ipcv.value_check(borderType,ipcv.BORDER_TYPES,'d',"borderType")
+	rowAxis, colAxis = axes
+	rows = src.shape[rowAxis]
+	cols = src.shape[colAxis]
+
+	shape = list(src.shape)
+	shape[rowAxis] += top + bottom
+	shape[colAxis] += left + right
+	shape = tuple(shape)
+	if dst is None:
+		dst = np.empty(shape, dtype=src.dtype)
+	elif dst.shape != shape:
+		print("-----------------------------------------------------------")
+		print("                       VALUE ERROR                       \n")
+		print("'dst' must have shape {0}, currently {1}".format(shape,dst.shape))
+		print("\n-----------------------------------------------------------")
+		raise ValueError
+
+	def region(rowSlice, colSlice):
+		index = [slice(None)] * src.ndim
+		index[rowAxis] = rowSlice
+		index[colAxis] = colSlice
+		return tuple(index)
+
+	center = slice(left, left + cols)
+	dst[region(slice(top, top + rows), center)] = src
+
+	if borderType == ipcv.BORDER_CONSTANT:
+		dst[region(slice(0, top), slice(None))] = value
+		dst[region(slice(top + rows, None), slice(None))] = value
+		dst[region(slice(None), slice(0, left))] = value
+		dst[region(slice(None), slice(left + cols, None))] = value
+		return dst
+
+	#filling the top and bottom strips from the copied rows (the strips are
+	#gathered with index arrays, np.take would copy the whole strided view)
+	if top > 0:
+		index = border_interpolate(np.arange(-top, 0), rows, borderType) + top
+		dst[region(slice(0, top), center)] = dst[region(index, center)]
+	if bottom > 0:
+		index = border_interpolate(np.arange(rows, rows + bottom), rows, borderType) + top
+		dst[region(slice(top + rows, None), center)] = dst[region(index, center)]
+
+	#filling the left and right strips (corners included) from full columns
+	if left > 0:
+		index = border_interpolate(np.arange(-left, 0), cols, borderType) + left
+		dst[region(slice(None), slice(0, left))] = dst[region(slice(None), index)]
+	if right > 0:
+		index = border_interpolate(np.arange(cols, cols + right), cols, borderType) + left
+		dst[region(slice(None), slice(left + cols, None))] = dst[region(slice(None), index)]
+
+	return dst
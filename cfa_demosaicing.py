@@ -1,6 +1,5 @@
 import numpy as np
 import cv2
-from scipy import signal
 import ipcv
 
 def maskBayer(raw,pattern_string="GBRG"):
@@ -28,144 +27,296 @@ def maskBayer(raw,pattern_string="GBRG"):
     rgb_bayer = np.dstack( (R,G,B) )
     return rgb_bayer
 
-def cfaDemosaic(raw,pattern_string="GBRG",window_size_rb=5,regularization_parameter=.01):
-    raw = raw.astype(np.float64)
-
-    banded_raw = maskBayer(raw,pattern_string)
-
-    red_band = banded_raw[:,:,0]
-    green_band = banded_raw[:,:,1]
-    blue_band = banded_raw[:,:,2]
-
-    # --------- GREEN COMPONENT ESTIMATION -------------
-
-    # ###### ======== pre-estimations =========== #########
-    # Calculating N,S,E,W pre-estimations for the blue band
-    preestimations_R = {}
-    preestimations_B = {}
-    preestimations_B["W"] = np.roll(green_band,-1,1)  + (blue_band - np.roll(blue_band,-2,1)) / 2.0
-    preestimations_B["E"] = np.roll(green_band,+1,1)  + (blue_band - np.roll(blue_band,+2,1)) / 2.0
-    preestimations_B["N"] = np.roll(green_band,-1,0)  + (blue_band - np.roll(blue_band,-2,0)) / 2.0
-    preestimations_B["S"] = np.roll(green_band,+1,1)  + (blue_band - np.roll(blue_band,+2,0)) / 2.0
-
-    # Calculating N,S,E,W pre-estimations for the red band
-    preestimations_R["W"] = np.roll(green_band,-1,1)  + (red_band - np.roll(red_band,-2,1)) / 2.0
-    preestimations_R["E"] = np.roll(green_band,+1,1)  + (red_band - np.roll(red_band,+2,1)) / 2.0
-    preestimations_R["N"] = np.roll(green_band,-1,0)  + (red_band - np.roll(red_band,-2,0)) / 2.0
-    preestimations_R["S"] = np.roll(green_band,+1,1)  + (red_band - np.roll(red_band,+2,0)) / 2.0
-
-    # Calculating NW,SW,NE,SE pre-estimations for the blue band
-    h8 = np.asarray([-1,4,-11,40,40,-11,4,-1]) / 64.0
-    diagonal_rolls = {
-                    "NW":[(-4,-3),(-3,-2),(-2,-1),(-1,0),(0,-1),(+1,-2),(+2,-3),(+3,-4)],
-                    "NE":[(+3,-4),(+2,-3),(+1,-2),(0,-1),(-1,0),(-2,+1),(-3,+2),(-4,+3)],
-                    "SE":[(+4,-3),(+3,-2),(+2,-1),(+1,0),(0,+1),(-1,+2),(-2,+3),(-3,+4)],
-                    "SW":[(-3,-4),(-2,-3),(-1,-2),(0,-1),(+1,0),(+2,+1),(+3,+2),(+4,+3)],
-                }
-
-    for key,value in diagonal_rolls.items():
-        diagnonal_sum = 0
-        for shift,multiplier in zip(value,h8):
-            diagnonal_sum =  (np.roll(green_band,shift,(0,1)) * multiplier) + diagnonal_sum
-        preestimations_R[key] = diagnonal_sum
-        preestimations_B[key] = diagnonal_sum
-
-    # Calculating the weighting factors for the pre-estimations
-    # gradients indices are
-    # --------- CALCULATING GRADIENTS -------------
-    epsilon = 1e-6
-    gradient_rolls = {
-                    "N":{"G":[ [(-2,-1),(+0,-1)],[(-3,+0),(-1,+0)],[(-2,+1),(+0,+1)] ],
-                         "R":[ [(-3,-1),(-1,-1)],[(-3,+1),(-1,+1)] ],
-                         "B":[ [(-2,+0),(+0,+0)] ] },
-                    "S":{"G":[ [(+2,-1),(+0,-1)],[(+3,+0),(+1,+0)],[(+2,+1),(+0,+1)] ],
-                         "R":[ [(+3,+1),(+1,-1)],[(+3,+1),(+1,+1)] ],
-                         "B":[ [(+2,+0),(+0,+0)] ] },
-                    "E":{"G":[ [(-1,+2),(-1,+0)],[(+1,+2),(+1,+0)],[(+0,+3),(+0,+1)] ],
-                         "R":[ [(-1,+3),(-1,+1)],[(+1,+3),(+1,+1)] ],
-                         "B":[ [(+0,+2),(+0,+0)] ] },
-                    "W":{"G":[ [(-1,-2),(-1,+0)],[(+1,-2),(+1,+0)],[(+0,-3),(+0,-1)] ],
-                         "R":[ [(-1,-3),(-1,-1)],[(+1,-3),(+1,-1)] ],
-                         "B":[ [(+0,-2),(+0,+0)] ] },
-                   "NW":{"G":[ [(-2,-1),(-1,+0)],[(-1,+0),(0,+1)],[(-1,-2),(+0,-1)],[(+0,-1),(+1,+0)] ],
-                         "R":[ [(-1,-1),(+1,+1)] ],
-                         "B":[ [(-2,-2),(+0,+0)] ] },
-                   "NE":{"G":[ [(-2,+1),(-1,+0)],[(-1,+0),(+0,-1)],[(-1,+2),(+0,+1)],[(+0,+1),(+1,+0)] ],
-                         "R":[ [(-1,+1),(+1,-1)] ],
-                         "B":[ [(-2,+2),(+0,+0)] ] },
-                   "SW":{"G":[ [(+1,-2),(+0,-1)],[(+0,-1),(-1,+0)],[(+2,-1),(+1,+0)],[(+1,+0),(+0,+1)] ],
-                         "R":[ [(-1,+1),(+1,-1)] ],
-                         "B":[ [(+2,-2),(+0,+0)] ] },
-                   "SE":{"G":[ [(+1,+2),(+0,+1)],[(+0,+1),(-1,+0)],[(+2,+1),(+1,+0)],[(+1,+0),(+0,-1)] ],
-                         "R":[ [(+1,+1),(-1,-1)] ],
-                         "B":[ [(+2,+2),(+0,+0)] ]}
-                         }
-    bands = {"G":green_band,"R":red_band,"B":blue_band}
-    weights = {}
-    for direction,pixel_pairs_by_band in gradient_rolls.items():
-        gradient = 0;
-        for band,pixel_pairs in pixel_pairs_by_band.items():
-            for shift_set in pixel_pairs:
-                gradient = gradient + np.abs( np.roll(bands[band],shift_set[0],(0,1)) - np.roll(bands[band],shift_set[1],(0,1)) )
+# rows of the frame demosaicked per pass, every intermediate image holds a
+# strip of this many rows (plus a halo) only
+_STRIP_ROWS = 64
+
+# N,S,E,W pre-estimations: (green shift, band shift) np.roll shifts along
+# (rows, cols), pre = roll(green, green shift) + (band - roll(band, band shift)) / 2
+# (S pairs a column shift of the green band with a row shift of the band)
+_AXIAL_PREESTIMATIONS = {
+                "W":[(0,-1),(0,-2)],
+                "E":[(0,+1),(0,+2)],
+                "N":[(-1,0),(-2,0)],
+                "S":[(0,+1),(+2,0)],
+            }
+
+# NW,SW,NE,SE pre-estimations, weighted sums of the green band rolled by these shifts
+_H8 = np.asarray([-1,4,-11,40,40,-11,4,-1]) / 64.0
+_DIAGONAL_ROLLS = {
+                "NW":[(-4,-3),(-3,-2),(-2,-1),(-1,0),(0,-1),(+1,-2),(+2,-3),(+3,-4)],
+                "NE":[(+3,-4),(+2,-3),(+1,-2),(0,-1),(-1,0),(-2,+1),(-3,+2),(-4,+3)],
+                "SE":[(+4,-3),(+3,-2),(+2,-1),(+1,0),(0,+1),(-1,+2),(-2,+3),(-3,+4)],
+                "SW":[(-3,-4),(-2,-3),(-1,-2),(0,-1),(+1,0),(+2,+1),(+3,+2),(+4,+3)],
+            }
+
+# gradient of every direction, sum of |roll(band, shift0) - roll(band, shift1)|
+_GRADIENT_ROLLS = {
+                "N":{"G":[ [(-2,-1),(+0,-1)],[(-3,+0),(-1,+0)],[(-2,+1),(+0,+1)] ],
+                     "R":[ [(-3,-1),(-1,-1)],[(-3,+1),(-1,+1)] ],
+                     "B":[ [(-2,+0),(+0,+0)] ] },
+                "S":{"G":[ [(+2,-1),(+0,-1)],[(+3,+0),(+1,+0)],[(+2,+1),(+0,+1)] ],
+                     "R":[ [(+3,+1),(+1,-1)],[(+3,+1),(+1,+1)] ],
+                     "B":[ [(+2,+0),(+0,+0)] ] },
+                "E":{"G":[ [(-1,+2),(-1,+0)],[(+1,+2),(+1,+0)],[(+0,+3),(+0,+1)] ],
+                     "R":[ [(-1,+3),(-1,+1)],[(+1,+3),(+1,+1)] ],
+                     "B":[ [(+0,+2),(+0,+0)] ] },
+                "W":{"G":[ [(-1,-2),(-1,+0)],[(+1,-2),(+1,+0)],[(+0,-3),(+0,-1)] ],
+                     "R":[ [(-1,-3),(-1,-1)],[(+1,-3),(+1,-1)] ],
+                     "B":[ [(+0,-2),(+0,+0)] ] },
+               "NW":{"G":[ [(-2,-1),(-1,+0)],[(-1,+0),(0,+1)],[(-1,-2),(+0,-1)],[(+0,-1),(+1,+0)] ],
+                     "R":[ [(-1,-1),(+1,+1)] ],
+                     "B":[ [(-2,-2),(+0,+0)] ] },
+               "NE":{"G":[ [(-2,+1),(-1,+0)],[(-1,+0),(+0,-1)],[(-1,+2),(+0,+1)],[(+0,+1),(+1,+0)] ],
+                     "R":[ [(-1,+1),(+1,-1)] ],
+                     "B":[ [(-2,+2),(+0,+0)] ] },
+               "SW":{"G":[ [(+1,-2),(+0,-1)],[(+0,-1),(-1,+0)],[(+2,-1),(+1,+0)],[(+1,+0),(+0,+1)] ],
+                     "R":[ [(-1,+1),(+1,-1)] ],
+                     "B":[ [(+2,-2),(+0,+0)] ] },
+               "SE":{"G":[ [(+1,+2),(+0,+1)],[(+0,+1),(-1,+0)],[(+2,+1),(+1,+0)],[(+1,+0),(+0,-1)] ],
+                     "R":[ [(+1,+1),(-1,-1)] ],
+                     "B":[ [(+2,+2),(+0,+0)] ]}
+                     }
+
+# pixels whose red and blue residuals also use their diagonal neighbours,
+# np.roll shifts
+_RESIDUAL_ROLLS = [(-1,-1),(-1,+1),(+1,-1),(+1,+1)]
+
+# reach of the largest shift of the tables
+_HALO = 4
+
+
+def _offset(shift):
+    """
+    (row, col) offset of the pixel that np.roll(band, shift, (0,1)) brings
+    to every position
+    """
+    return (-shift[0], -shift[1])
+
+
+def _gradient_stencil():
+    """
+    the gradients as sums of views of a few absolute difference images
+
+    |band[p+u] - band[p+w]| is D_v[p+u] with D_v[k] = |band[k] - band[k+v]|
+    and v = w - u, (u and w swapped so that v points down or right), so
+    the ~50 differences of the table are views of a handful of D_v
+
+    returns the distinct v and, per direction, the (v, u) of its terms
+    """
+    vectors = []
+    terms = {}
+    for direction, pairs_by_band in _GRADIENT_ROLLS.items():
+        terms[direction] = []
+        #every band of the table holds the raw frame (see cfaDemosaic)
+        for band, pairs in pairs_by_band.items():
+            for shift0, shift1 in pairs:
+                u, w = _offset(shift0), _offset(shift1)
+                v = (w[0] - u[0], w[1] - u[1])
+                if v < (0, 0):
+                    u, w = w, u
+                    v = (-v[0], -v[1])
+                if v not in vectors:
+                    vectors.append(v)
+                terms[direction].append( (v, u) )
+    return vectors, terms
+
+
+_GRADIENT_VECTORS, _GRADIENT_TERMS = _gradient_stencil()
+
+
+def _wrap_rows(array, top, bottom):
+    """
+    rows [top, bottom) of 'array', wrapping around its edges like np.roll
+    """
+    rows = array.shape[0]
+    if top >= 0 and bottom <= rows:
+        return array[top:bottom]
+    return array.take(np.arange(top, bottom) % rows, axis=0)
+
+
+def _wrap_cols(array, halo):
+    """
+    'array' padded by 'halo' columns on each side, wrapping like np.roll
+    """
+    cols = array.shape[1]
+    return array.take(np.arange(-halo, cols + halo) % cols, axis=1)
+
+
+def _green_strip(padded, green, dtype, epsilon=1e-6):
+    """
+    green estimation of the rows of 'padded' (the raw frame wrapped by
+    _HALO pixels on every side) into 'green'
+
+    every pre-estimation is a fixed stencil of views of 'padded' and every
+    gradient a sum of views of the shared absolute difference images, the
+    weighted average accumulates one direction at a time
+    """
+    rows, cols = green.shape
+    halo = _HALO
+    height, width = padded.shape
+
+    def view(offset):
+        return padded[halo+offset[0]:halo+offset[0]+rows, halo+offset[1]:halo+offset[1]+cols]
+
+    center = view( (0,0) )
+    differences = {}
+    for v in _GRADIENT_VECTORS:
+        #D_v over every k of the padded strip whose k+v is inside it
+        left = max(0, -v[1])
+        right = width - max(0, v[1])
+        differences[v] = np.abs( padded[:height-v[0], left:right] - padded[v[0]:, left+v[1]:right+v[1]] )
+
+    numerator = np.zeros( (rows,cols), dtype=dtype )
+    weight_sum = np.zeros( (rows,cols), dtype=dtype )
+    gradient = np.empty( (rows,cols), dtype=dtype )
+    preestimation = np.empty( (rows,cols), dtype=dtype )
+    for direction, terms in _GRADIENT_TERMS.items():
+        gradient[...] = 0
+        for v, u in terms:
+            left = max(0, -v[1])
+            gradient += differences[v][halo+u[0]:halo+u[0]+rows, halo+u[1]-left:halo+u[1]-left+cols]
         gradient += epsilon
-        weights[direction] = 1.0 / gradient
-
-    green_estimation_B = 0
-    green_estimation_R = 0
-    weight_sum = 0
-    for direction in gradient_rolls.keys():
-        green_estimation_B = green_estimation_B + (preestimations_B[direction] * weights[direction])
-        green_estimation_R = green_estimation_R + (preestimations_R[direction] * weights[direction])
-        weight_sum = weight_sum + weights[direction]
-
-    green_estimation_R = (green_estimation_R / weight_sum)
-    green_estimation_B = (green_estimation_B / weight_sum)
-
-    green_estimation = green_estimation_R + green_estimation_B
-
-    # --------------- Red and Blue component estimation -------------
-    # calculating components for both red and blue estimation
+        np.divide(1.0, gradient, out=gradient)
+
+        if direction in _AXIAL_PREESTIMATIONS:
+            green_shift, band_shift = _AXIAL_PREESTIMATIONS[direction]
+            np.subtract(center, view(_offset(band_shift)), out=preestimation)
+            preestimation /= 2.0
+            preestimation += view(_offset(green_shift))
+        else:
+            preestimation[...] = 0
+            for shift, multiplier in zip(_DIAGONAL_ROLLS[direction], _H8):
+                preestimation += view(_offset(shift)) * dtype(multiplier)
+
+        preestimation *= gradient
+        numerator += preestimation
+        weight_sum += gradient
+
+    #the red and blue estimations are the same weighted average
+    np.divide(numerator, weight_sum, out=green)
+    green *= 2
+
+
+def _regression_mask(green, raw, top, bottom, window_size_rb, dtype):
+    """
+    pixels of the rows [top, bottom) whose local regression of the raw
+    frame on the green estimation is degenerate (a zero numerator), the
+    red and blue approximations are zero there and their residuals are
+    not added around them
+
+    the window sums see zeros beyond the frame (as signal.convolve2d)
+    """
+    rows, cols = green.shape
+    radius = window_size_rb // 2
+    first = max(0, top - radius)
+    last = min(rows, bottom + radius)
+    height = bottom - top + 2*radius
     window_coefficient = 1.0 / (window_size_rb **2)
-    summation_kernel = np.ones( (window_size_rb,window_size_rb) )
-    average_kernel = window_coefficient * np.ones( (window_size_rb,window_size_rb) )
-    local_average_G = signal.convolve2d(green_estimation,average_kernel,mode="same")
-    local_average_Gsquared = signal.convolve2d(green_estimation**2,average_kernel,mode="same")
-    local_stddev_G = (1.0 / (window_size_rb**2 - 1) ) * (local_average_Gsquared - (local_average_G**2 * window_coefficient ))
-
-    # calculating R
-    local_average_R = signal.convolve2d(green_estimation,average_kernel,mode="same")
-    a_numerator_R = (window_coefficient * signal.convolve2d((green_estimation*red_band),summation_kernel, mode="same" )) - (local_average_G * local_average_R)
-    a_denominator_R = local_stddev_G + regularization_parameter
-    a_R = a_numerator_R / a_numerator_R
-    b_R = local_average_R - (a_R * local_average_G)
-
-    R_approx = (a_R * green_estimation) + b_R
-
-
-    # calculating B
-    local_average_B = signal.convolve2d(green_estimation,average_kernel,mode="same")
-    a_numerator_B = (window_coefficient * signal.convolve2d( (green_estimation*blue_band),summation_kernel,mode="same") ) - (local_average_G * local_average_B)
-    a_denominator_B = local_stddev_G + regularization_parameter
-    a_B = a_numerator_B / a_numerator_B
-    b_B = local_average_B - (a_B * local_average_G)
-
-    B_approx = (a_B * green_estimation) + b_B
-
-    # ------------------------- Calculating Residuals ---------------
-    calcResidualR = lambda i,j: blue_band - np.roll(B_approx,(i,j),(0,1))
-    calcResidualB = lambda i,j: red_band - np.roll(R_approx,(i,j),(0,1))
-
-
-    residual_B = np.clip((blue_band - B_approx ),0,None) + (calcResidualB(-1,-1) + calcResidualB(-1,+1) + calcResidualB(+1,-1) + calcResidualB(+1,+1)) / 4.0
-    residual_R = np.clip((red_band - R_approx),0,None) + (calcResidualR(-1,-1) + calcResidualR(-1,+1) + calcResidualR(+1,-1) + calcResidualR(+1,+1)) / 4.0
-
-
-
-    red_estimation = R_approx + residual_R
-    blue_estimation = B_approx + residual_B
 
-    res = np.dstack( (red_estimation,green_estimation,blue_estimation) ).astype(np.uint8)
-    return res
+    strip = np.zeros( (height, cols + 2*radius), dtype=dtype )
+    product = np.zeros( (height, cols + 2*radius), dtype=dtype )
+    inner = slice(first - (top - radius), last - (top - radius))
+    strip[inner, radius:radius+cols] = green[first:last]
+    np.multiply(strip[inner, radius:radius+cols], raw[first:last], out=product[inner, radius:radius+cols])
+
+    box = lambda image: cv2.boxFilter(image, -1, (window_size_rb, window_size_rb), normalize=False,
+                                      borderType=cv2.BORDER_CONSTANT)[radius:height-radius, radius:radius+cols]
+    local_average_G = box(strip) * dtype(window_coefficient)
+    numerator = box(product) * dtype(window_coefficient)
+    numerator -= local_average_G * local_average_G
+    return numerator == 0
+
+
+def cfaDemosaic(raw,pattern_string="GBRG",window_size_rb=5,regularization_parameter=.01,dtype=np.float32):
+    """
+    :purpose:
+        demosaics a raw color filter array frame from directionally weighted
+        green pre-estimations, a local regression of the red and blue bands
+        on the green estimation and their diagonal residuals
+
+        the frame is processed a strip of rows at a time: the pre-estimations
+        are fixed stencils over views of the frame padded once per strip, the
+        ~50 gradient differences are views of a handful of shared absolute
+        difference images, and the window sums are box filters, so there are
+        no full-frame np.roll copies and the intermediates are 'dtype'
+
+        the output reproduces the original pixel-per-roll implementation,
+        whose bands all hold the unmasked raw frame (np.dstack drops the
+        masks of maskBayer), np.roll wraps around the frame edges and
+        'regularization_parameter' is not used
+    :inputs:
+        raw [np.ndarray]
+            '--> (rows,cols) raw frame
+        pattern_string [str]
+            '--> bayer pattern, 'GBRG', 'GRBG', 'BGGR' or 'RGGB'
+        window_size_rb [int]
+            '--> size of the red and blue regression window
+        regularization_parameter [float]
+            '--> unused
+        dtype [numpy.dtype]
+            '--> precision of the intermediates, np.float32 or np.float64
+    :return:
+        demosaicked frame [np.ndarray] (uint8, rows x cols x 3, RGB)
+    """
+
+    #ERROR CHECKING
+    ipcv.type_check(raw,(np.ndarray,),"raw")
+    ipcv.value_check(raw.ndim,2,'e',"raw.ndim")
+    ipcv.value_check(pattern_string,("GBRG","GRBG","BGGR","RGGB"),'d',"pattern_string")
+    ipcv.value_check(window_size_rb,(1,":"),'b',"window_size_rb")
+    dtype = np.dtype(dtype).type
+    ipcv.value_check(dtype,(np.float32,np.float64),'d',"dtype")
+
+    try:
+        rows, cols = raw.shape
+        raw = raw.astype(dtype, copy=False)
+        green = np.empty( (rows,cols), dtype=dtype )
+        res = np.empty( (rows,cols,3), dtype=np.uint8 )
+
+        # --------- GREEN COMPONENT ESTIMATION -------------
+        for top in range(0, rows, _STRIP_ROWS):
+            bottom = min(top + _STRIP_ROWS, rows)
+            padded = _wrap_cols(_wrap_rows(raw, top - _HALO, bottom + _HALO), _HALO)
+            _green_strip(padded, green[top:bottom], dtype)
+            res[top:bottom,:,1] = green[top:bottom].astype(np.uint8)
+
+        # --------------- Red and Blue component estimation -------------
+        degenerate = np.empty( (rows,cols), dtype=bool )
+        for top in range(0, rows, _STRIP_ROWS):
+            bottom = min(top + _STRIP_ROWS, rows)
+            degenerate[top:bottom] = _regression_mask(green, raw, top, bottom, window_size_rb, dtype)
+
+        # ------------------------- Calculating Residuals ---------------
+        for top in range(0, rows, _STRIP_ROWS):
+            bottom = min(top + _STRIP_ROWS, rows)
+            approx = _wrap_cols(_wrap_rows(green, top - 1, bottom + 1), 1)
+            masked = _wrap_cols(_wrap_rows(degenerate, top - 1, bottom + 1), 1)
+            approx[masked] = 0
+            height = bottom - top
+            view = lambda image, offset: image[1+offset[0]:1+offset[0]+height, 1+offset[1]:1+offset[1]+cols]
+
+            band = raw[top:bottom]
+            center = view(approx, (0,0))
+            residual = np.clip(band - center, 0, None)
+            neighbours = 0
+            excluded = view(masked, (0,0)).copy()
+            for shift in _RESIDUAL_ROLLS:
+                offset = _offset(shift)
+                neighbours = (band - view(approx, offset)) + neighbours
+                excluded |= view(masked, offset)
+            residual += neighbours / 4.0
+
+            estimation = center + residual
+            estimation[excluded] = center[excluded]
+            estimation = estimation.astype(np.uint8)
+            res[top:bottom,:,0] = estimation
+            res[top:bottom,:,2] = estimation
+
+        return res
+
+    except Exception as e:
+        ipcv.debug(e)
 
 
 
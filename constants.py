@@ -6,12 +6,17 @@ INTER_NEAREST = 0   # Nearest-neighbor interpolation
 INTER_LINEAR = 1    # Bilinear interpolation
 INTER_CUBIC = 2     # Bicubic interpolation over a 4x4 pixel neighborhood
 
+# Fixed-point remap maps (fractions in 1/INTER_TAB_SIZE of a pixel)
+INTER_BITS = 5
+INTER_TAB_SIZE = 1 << INTER_BITS
+
 # Border types (image boundaries denoted by '|')
 BORDER_CONSTANT = 0      # iiiiii|abcdefgh|iiiiii
 BORDER_REPLICATE = 1     # aaaaaa|abcdefgh|hhhhhh
 BORDER_REFLECT = 2       # fedcba|abcdefgh|hgfedc
 BORDER_REFLECT_101 = 4   # gfedcb|abcdefgh|gfedcb
 BORDER_WRAP = 3          # cdefgh|abcdefgh|abcdef
+BORDER_TYPES = (BORDER_CONSTANT,BORDER_REPLICATE,BORDER_REFLECT,BORDER_REFLECT_101,BORDER_WRAP)
 
 # Destination depths
 IPCV_8U = numpy.uint8      # 8-bit unsigned int
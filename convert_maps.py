@@ -0,0 +1,68 @@
+import numpy as np
+import ipcv
+
+
+def convert_maps(map1, map2=None, nearest=False):
+	"""
+	:purpose:
+		converts floating point remap maps into the compact fixed-point
+		format understood by ipcv.remap (equivalent of cv2.convertMaps to
+		CV_16SC2)
+
+		map1 receives the int16 (x,y) integer coordinates and map2 the
+		uint16 fractions, in 1/ipcv.INTER_TAB_SIZE of a pixel, packed as
+		fy*ipcv.INTER_TAB_SIZE + fx, i.e. 6 bytes per pixel instead of the
+		8 of a float32 pair, maps for nearest neighbour interpolation need
+		no fractions and take 4 bytes per pixel
+	:inputs:
+		map1 [np.ndarray]
+			'--> float x coordinates (rows,cols) or (x,y) pairs (rows,cols,2)
+		map2 [np.ndarray, None]
+			'--> float y coordinates when map1 only holds x coordinates
+		nearest [bool]
+			'--> round to the nearest pixel and drop the fractions
+	:return:
+		fixed-point map1 [np.ndarray] (int16, rows x cols x 2),
+		fractions map2 [np.ndarray] (uint16, rows x cols) or None
+	"""
+
+	#ERROR CHECKING
+	ipcv.type_check(map1,(np.ndarray,),"map1")
+	ipcv.value_check(map1.ndim,(2,3),'d',"map1.ndim")
+	if map1.ndim == 2:
+		ipcv.type_check(map2,(np.ndarray,),"map2")
+		ipcv.value_check(map2.shape,(map1.shape,),'d',"map2.shape")
+
+	try:
+		if map1.ndim == 3:
+			x = map1[:,:,0]
+			y = map1[:,:,1]
+		else:
+			x = map1
+			y = map2
+
+		limits = np.iinfo(np.int16)
+		scale = 1 if nearest else ipcv.INTER_TAB_SIZE
+		fixed = np.empty(x.shape + (2,), dtype=np.int16)
+		fractions = None if nearest else np.empty(x.shape, dtype=np.uint16)
+
+		#coordinates scaled to 1/ipcv.INTER_TAB_SIZE of a pixel, split into
+		#their integer part and fraction
+		for axis, coordinate in enumerate( (x, y) ):
+			scaled = np.rint(coordinate * scale)
+			np.clip(scaled, limits.min * scale, limits.max * scale, out=scaled)
+			scaled = scaled.astype(np.int32)
+			if nearest:
+				fixed[:,:,axis] = scaled
+				continue
+			fixed[:,:,axis] = scaled >> ipcv.INTER_BITS
+			fraction = scaled & (ipcv.INTER_TAB_SIZE - 1)
+			if axis == 0:
+				fractions[...] = fraction
+			else:
+				fractions += (fraction << ipcv.INTER_BITS).astype(np.uint16)
+
+		return fixed, fractions
+
+	except Exception as e:
+		ipcv.debug(e)
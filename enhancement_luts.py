@@ -0,0 +1,95 @@
+import weakref
+import numpy as np
+import ipcv
+
+# target cdfs of the 'match' mode, by target identity
+_targetCdfs = {}
+
+
+def _target_cdfs(target, maxCount):
+	"""
+	(bands, maxCount+1) cdfs of a target image, or the cdf of a 1-D target
+	distribution, computed once per target array (and maxCount) for as
+	long as the array is alive, a target modified in place between calls
+	must be passed as a new array
+	"""
+	key = (id(target), maxCount)
+	entry = _targetCdfs.get(key)
+	if entry is not None and entry[0]() is target:
+		return entry[1]
+
+	if target.ndim == 1:
+		cdfs = np.cumsum(target)[np.newaxis]
+	else:
+		cdfs = ipcv.histogram(img=target,channels=None,histSize=(maxCount+1),\
+			ranges=[0,maxCount+1],returnType=1)[2]
+	cdfs.setflags(write=False)
+
+	def release(ref):
+		if _targetCdfs.get(key, (None,))[0] is ref:
+			del _targetCdfs[key]
+	_targetCdfs[key] = (weakref.ref(target, release), cdfs)
+	return cdfs
+
+
+def enhancement_luts(etype, cdfs, target, maxCount, luts):
+	"""
+	:purpose:
+		fills 'luts' with the global lookup tables of
+		ipcv.histogram_enhancement for the cdfs of every band, shared by
+		ipcv.histogram_enhancement and ipcv.HistogramEnhancer
+	:inputs:
+		etype [str]
+			'--> 'linearN' (N percent stretch), 'equalize' or 'match'
+		cdfs [np.ndarray]
+			'--> (bands, maxCount+1) cdfs of the image
+		target [np.ndarray]
+			'--> target image or distribution of 'match'
+		maxCount [int]
+			'--> the largest possible digital count
+		luts [np.ndarray]
+			'--> (bands, maxCount+1) output tables
+	:return:
+		luts [np.ndarray]
+	"""
+	bands = luts.shape[0]
+	if "linear" in etype:
+		for band in range(bands):
+			cdf = cdfs[band]
+
+			# generating components of the line
+			lowerBound = (float(etype.replace("linear","") ) / 200.0) #1/2 input on each side
+			upperbound = ( 1 - lowerBound )
+			dcLow = np.where(cdf >= lowerBound)[0][0]
+			dcHigh = np.where(cdf <= upperbound)[0][-1]
+			m = ( maxCount / (dcHigh - dcLow) )
+			b = maxCount - ( m * dcHigh )
+
+			#generating the lookup table by applying a linear transform
+			LUT = ( m * np.arange(maxCount+1) ) + b
+			LUT = np.clip(LUT,0,maxCount)
+			luts[band] = LUT
+
+	elif etype == 'equalize':
+		for band in range(bands):
+			cdf = cdfs[band]
+
+			LUT = (cdf * maxCount).flatten()
+			luts[band] = LUT
+
+	elif etype == "match":
+		#Generating the target CDFs
+		tCdf = _target_cdfs(target, maxCount)
+
+		for band in range(bands):
+			cdf = cdfs[band]
+			targetCdf = tCdf[band % tCdf.shape[0]]
+
+			#first target level whose cdf reaches the cdf of every level
+			#(the last level when rounding leaves none that does)
+			LUT = np.searchsorted(targetCdf, cdf, side='left')
+			np.minimum(LUT, targetCdf.size - 1, out=LUT)
+
+			luts[band] = LUT
+
+	return luts
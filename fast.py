@@ -1,50 +1,181 @@
 import ipcv
 import numpy as np
 import cv2
-import logging
-
-def fast(src, differenceThreshold=50, contiguousThreshold=12, nonMaximalSuppression=True,debug=True):
-	img = src.copy()
-	circumference = 16
-	rollArray = [ [-3,0],[-3,-1],[-2,-2],[-1,-3],
-				  [0,-3],[1,-3],[2,-2],[3,-1],
-				  [3,0],[3,1],[2,2],[1,3],
-				  [0,3],[-1,3],[-2,2],[-3,1] ]
-	dims = ipcv.dimensions(img,'dict')
-	
-	allCorners = np.zeros(img.shape)
-	maximaSum = allCorners
-	points = np.zeros( (dims["rows"], dims["cols"], circumference) )
-	unchanged = np.zeros( (dims["rows"], dims["cols"], circumference))
-
-	for index,rc in enumerate(rollArray):
-		points[:,:,index] = np.roll( np.roll(img,rc[0],axis=0), rc[1],axis=1)
-		unchanged[:,:,index] = img
-
-	greaterThan = (unchanged - points) > differenceThreshold
-	lessThan = ( (points - unchanged) > differenceThreshold )
-
-	for band in range(circumference):
-		posOverlap = greaterThan[:,:,0:contiguousThreshold] == 1
-		negOverlap = lessThan[:,:,0:contiguousThreshold] == 1
-		posCornerCheck = np.sum(posOverlap,axis=2)	
-		negCornerCheck = np.sum(negOverlap,axis=2)
-
-		allCorners[np.where(posCornerCheck >= contiguousThreshold)] = 1
-		allCorners[np.where(negCornerCheck >= contiguousThreshold)] = 1
-
-
-		maximaSum = maximaSum + allCorners
-		greaterThan = np.roll(greaterThan,1,axis=2)
-		lessThan = np.roll(lessThan,1,axis=2)
-
-	# if nonMaximalSuppression:
-	# 	firstDerivative = np.gradient(maximaSum)
-	# 	secondDerivative = np.gradient(maximaSum)
-
-
-	finalCorners = np.clip(allCorners,0,1).astype(ipcv.IPCV_8U)
-	return finalCorners
+
+# (row, col) offsets of the 16 pixels of the Bresenham circle of radius 3,
+# in order around the circle
+_CIRCLE = ( (-3,0),(-3,1),(-2,2),(-1,3),
+            (0,3),(1,3),(2,2),(3,1),
+            (3,0),(3,-1),(2,-2),(1,-3),
+            (0,-3),(-1,-3),(-2,-2),(-3,-1) )
+_RADIUS = 3
+
+# the segment test is run on strips of this many rows so that the masks
+# stay small on large frames
+_STRIP_ROWS = 64
+
+# longest cyclic run of set bits for every 16 bit ring mask, built on first use
+_runLengths = None
+
+
+def _run_lengths():
+	"""
+	returns the 65536 entry table of the longest cyclic run of set bits in
+	every 16 bit mask
+	"""
+	global _runLengths
+	if _runLengths is None:
+		masks = np.arange(65536, dtype=np.uint32)
+		#doubling the mask so that runs wrapping around the circle are seen
+		#whole, each erosion x & (x >> 1) shortens every run by one bit
+		runs = masks | (masks << 16)
+		lengths = np.zeros(65536, dtype=np.uint8)
+		for n in range(16):
+			lengths += (runs != 0)
+			runs &= runs >> 1
+		lengths[65535] = 16
+		_runLengths = lengths
+	return _runLengths
+
+
+def _segment_test(img, top, bottom, differenceThreshold, contiguousThreshold):
+	"""
+	returns the raster index of the pixels of rows [top, bottom) that pass
+	the segment test
+	"""
+	rows, cols = img.shape
+	r = _RADIUS
+	center = img[top:bottom, r:cols-r]
+
+	#packing the brighter and darker comparisons of the circle (the
+	#thresholds are widened so that integer images do not overflow)
+	work = np.promote_types(img.dtype, np.int16)
+	upper = center.astype(work) + differenceThreshold
+	lower = center.astype(work) - differenceThreshold
+	brighter = np.zeros(center.shape, dtype=np.uint16)
+	darker = np.zeros(center.shape, dtype=np.uint16)
+	compared = np.empty(center.shape, dtype=bool)
+	bits = np.empty(center.shape, dtype=np.uint16)
+	for index, (dy, dx) in enumerate(_CIRCLE):
+		circle = img[top+dy:bottom+dy, r+dx:cols-r+dx]
+		np.greater(circle, upper, out=compared)
+		np.left_shift(compared, index, out=bits, dtype=np.uint16)
+		brighter |= bits
+		np.less(circle, lower, out=compared)
+		np.left_shift(compared, index, out=bits, dtype=np.uint16)
+		darker |= bits
+
+	runLengths = _run_lengths()
+	corners = runLengths[brighter] >= contiguousThreshold
+	corners |= runLengths[darker] >= contiguousThreshold
+	cornerRows, cornerCols = np.nonzero(corners)
+	return (cornerRows + top) * cols + (cornerCols + r)
+
+
+def _suppress(index, scores, cols):
+	"""
+	keeps the candidates (sorted raster 'index' of an image 'cols' wide)
+	whose score is the largest of their 3x3 neighbourhood, ties go to the
+	first candidate in raster order
+	"""
+	keep = np.ones(index.size, dtype=bool)
+	for dy in (-1,0,1):
+		for dx in (-1,0,1):
+			if dy == 0 and dx == 0:
+				continue
+			#looking the neighbours up among the candidates, pixels that are
+			#not candidates have no score
+			neighbour = index + dy*cols + dx
+			position = np.minimum( np.searchsorted(index, neighbour), index.size - 1 )
+			found = index[position] == neighbour
+			neighbourScores = np.where(found, scores[position], -1)
+			if (dy, dx) < (0, 0):
+				keep &= scores > neighbourScores
+			else:
+				keep &= scores >= neighbourScores
+	return keep
+
+
+def fast(src, differenceThreshold=50, contiguousThreshold=12, nonMaximalSuppression=True, debug=True, returnType="mask"):
+	"""
+	:purpose:
+		FAST (features from accelerated segment test) corner detector
+
+		a pixel is a corner when at least 'contiguousThreshold' contiguous
+		pixels of the 16 pixel circle around it are all brighter or all
+		darker than it by more than 'differenceThreshold', the circle
+		comparisons of every pixel are packed into two 16 bit masks that
+		are tested against a table of their longest contiguous run
+
+		corners are scored by the larger of the sums of the absolute
+		differences (less the threshold) of their brighter and darker
+		circle pixels, and non maximal suppression keeps the corners whose
+		score is the largest of their 3x3 neighbourhood, pixels closer than
+		3 pixels to the image edge are never corners
+	:inputs:
+		src [np.ndarray]
+			'--> grayscale (or BGR) image
+		differenceThreshold [int]
+			'--> intensity difference from the center pixel
+		contiguousThreshold [int]
+			'--> number of contiguous circle pixels (1 to 16)
+		nonMaximalSuppression [bool]
+			'--> suppress corners that are not local score maxima
+		debug [bool]
+			'--> unused
+		returnType [str]
+			'--> "mask" returns a uint8 corner mask, "keypoints" returns the
+				 (row, col) corner coordinates and their scores
+	:return:
+		corner mask [np.ndarray] (ipcv.IPCV_8U, 1 at corners)
+		or
+		keypoints [np.ndarray] (N x 2 rows and cols), scores [np.ndarray] (N)
+	"""
+
+	#ERROR CHECKING
+	ipcv.type_check(src,(np.ndarray,),"src")
+	ipcv.value_check(contiguousThreshold,(1,16),'b',"contiguousThreshold")
+	ipcv.value_check(returnType,("mask","keypoints"),'d',"returnType")
+
+	try:
+		img = src
+		if img.ndim == 3:
+			img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+		img = np.ascontiguousarray(img)
+		rows, cols = img.shape
+		r = _RADIUS
+		strips = [ _segment_test(img, top, min(top + _STRIP_ROWS, rows - r),
+		                         differenceThreshold, contiguousThreshold)
+		           for top in range(r, rows - r, _STRIP_ROWS) ]
+		index = np.concatenate(strips) if strips else np.zeros(0, dtype=np.intp)
+
+		#scoring the candidates only
+		pixels = img.ravel()
+		value = pixels[index].astype(np.float32)
+		brightScore = np.zeros(index.size, dtype=np.float32)
+		darkScore = np.zeros(index.size, dtype=np.float32)
+		for dy, dx in _CIRCLE:
+			difference = pixels[index + (dy*cols + dx)] - value
+			brightScore += np.maximum(difference - differenceThreshold, 0)
+			darkScore += np.maximum(-difference - differenceThreshold, 0)
+		scores = np.maximum(brightScore, darkScore)
+
+		if nonMaximalSuppression and index.size > 0:
+			keep = _suppress(index, scores, cols)
+			index = index[keep]
+			scores = scores[keep]
+
+		cornerRows, cornerCols = np.divmod(index, cols)
+
+		if returnType == "keypoints":
+			return np.stack( (cornerRows, cornerCols), axis=1 ), scores
+
+		finalCorners = np.zeros( (rows, cols), dtype=ipcv.IPCV_8U )
+		finalCorners[cornerRows, cornerCols] = 1
+		return finalCorners
+
+	except Exception as e:
+		ipcv.debug(e)
 
 
 
@@ -0,0 +1,159 @@
+import inspect
+from collections import OrderedDict
+import numpy as np
+
+try:
+	import scipy.fft
+except ImportError:
+	scipy = None
+
+try:
+	import pyfftw
+	import pyfftw.builders
+except ImportError:
+	pyfftw = None
+
+# numpy >= 2.0 can write transforms into a preallocated array
+_NUMPY_HAS_OUT = 'out' in inspect.signature(np.fft.fft).parameters
+
+FFT_LIBRARIES = ("numpy", "scipy", "fftw")
+
+
+class FFTBackend(object):
+	"""
+	:purpose:
+		pluggable 2D FFT engine used by the frequency domain routines
+
+		"numpy" -- numpy.fft, transforms are written into 'out' one axis at
+			a time when numpy supports it (numpy >= 2.0)
+		"scipy" -- scipy.fft, multithreaded through 'workers'
+		"fftw" -- pyFFTW (if installed), one FFTW plan is built per
+			(transform, shape, dtype, axes) and reused on later calls
+
+		inverse transforms may overwrite their input, and the fftw plans
+		own their arrays, so a backend must not be shared between threads
+	:inputs:
+		library [str]
+			'--> one of "numpy", "scipy" or "fftw"
+		workers [int]
+			'--> number of threads used by the "scipy" and "fftw" libraries
+		maxPlans [int]
+			'--> number of fftw plans kept before the least recently used
+				 plan is released
+	"""
+
+	def __init__(self, library="numpy", workers=1, maxPlans=8):
+		if library not in FFT_LIBRARIES:
+			print("-----------------------------------------------------------")
+			print("                       VALUE ERROR                       \n")
+			print("'library' must be one of the following values {0}".format(FFT_LIBRARIES))
+			print("\n-----------------------------------------------------------")
+			raise ValueError
+		if (library == "scipy" and scipy is None) or (library == "fftw" and pyfftw is None):
+			print("-----------------------------------------------------------")
+			print("                       IMPORT ERROR                       \n")
+			print("the '{0}' FFT library is not installed".format(library))
+			print("\n-----------------------------------------------------------")
+			raise ImportError
+
+		self._library = library
+		self._workers = workers
+		self._maxPlans = maxPlans
+		self._plans = OrderedDict()
+
+	@property
+	def library(self):
+		return self._library
+
+	@property
+	def workers(self):
+		return self._workers
+
+	def _plan(self, builder, a, s, axes):
+		"""
+		returns the cached fftw plan for a transform of arrays like 'a'
+		"""
+		key = (builder, a.shape, a.dtype.str, s, axes)
+		plan = self._plans.get(key)
+		if plan is None:
+			build = getattr(pyfftw.builders, builder)
+			plan = build(a, s=s, axes=axes, threads=self._workers,
+			             planner_effort='FFTW_MEASURE')
+			self._plans[key] = plan
+			while len(self._plans) > self._maxPlans:
+				self._plans.popitem(last=False)
+		else:
+			self._plans.move_to_end(key)
+		return plan
+
+	@staticmethod
+	def _store(result, out):
+		if out is None:
+			return result
+		out[...] = result
+		return out
+
+	def rfft2(self, a, axes=(0,1), out=None):
+		"""
+		:purpose:
+			half spectrum of the real array 'a' over 'axes' (the last axis
+			in 'axes' is halved)
+		"""
+		if self._library == "numpy":
+			if _NUMPY_HAS_OUT and out is not None:
+				np.fft.rfft(a, axis=axes[1], out=out)
+				return np.fft.fft(out, axis=axes[0], out=out)
+			return self._store(np.fft.rfft2(a, axes=axes), out)
+
+		elif self._library == "scipy":
+			return self._store(scipy.fft.rfft2(a, axes=axes, workers=self._workers), out)
+
+		else:
+			plan = self._plan("rfftn", a, None, axes)
+			return self._store(plan(a), out) if out is not None else plan(a).copy()
+
+	def irfft2(self, a, s, axes=(0,1), out=None):
+		"""
+		:purpose:
+			real inverse of the half spectrum 'a', 's' is the (rows, cols)
+			shape of the spatial result ('a' may be overwritten)
+		"""
+		s = tuple(s)
+		if self._library == "numpy":
+			if _NUMPY_HAS_OUT and out is not None:
+				np.fft.ifft(a, axis=axes[0], out=a)
+				return np.fft.irfft(a, n=s[1], axis=axes[1], out=out)
+			return self._store(np.fft.irfft2(a, s=s, axes=axes), out)
+
+		elif self._library == "scipy":
+			return self._store(scipy.fft.irfft2(a, s=s, axes=axes, workers=self._workers,
+			                                    overwrite_x=True), out)
+
+		else:
+			plan = self._plan("irfftn", a, s, axes)
+			return self._store(plan(a), out) if out is not None else plan(a).copy()
+
+	def fft2(self, a, axes=(0,1), out=None, inverse=False):
+		"""
+		:purpose:
+			full complex (inverse) transform of 'a' over 'axes', 'out' may
+			be 'a' itself for an in place transform
+		"""
+		if self._library == "numpy":
+			transform = np.fft.ifft if inverse else np.fft.fft
+			if _NUMPY_HAS_OUT and out is not None:
+				#two 1D passes, multi-axis transforms cannot write in place
+				transform(a, axis=axes[0], out=out)
+				return transform(out, axis=axes[1], out=out)
+			return self._store(transform(transform(a, axis=axes[0]), axis=axes[1]), out)
+
+		elif self._library == "scipy":
+			transform = scipy.fft.ifft2 if inverse else scipy.fft.fft2
+			return self._store(transform(a, axes=axes, workers=self._workers), out)
+
+		else:
+			plan = self._plan("ifftn" if inverse else "fftn", a, None, axes)
+			return self._store(plan(a), out) if out is not None else plan(a).copy()
+
+	def ifft2(self, a, axes=(0,1), out=None):
+		return self.fft2(a, axes=axes, out=out, inverse=True)
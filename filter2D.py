@@ -1,7 +1,150 @@
+import threading
+from collections import OrderedDict
 import numpy as np
 import ipcv
 
-def filter2D(src, dstDepth, kernel, delta=0, maxCount=255):
+# execution engines understood by filter2D
+FILTER2D_ENGINES = ("auto", "direct", "separable", "fft")
+
+# precisions filter2D can accumulate in
+FILTER2D_ACC_DEPTHS = (ipcv.IPCV_32F, ipcv.IPCV_64F)
+
+# kernels with at least this many taps are cheaper to apply in the frequency
+# domain than tap by tap (crossover measured on 1080p frames)
+_FFT_MIN_TAPS = 81
+
+# kernel spectra are cached so that repeated calls with the same kernel and
+# frame size only pay for the image transforms
+_SPECTRUM_CACHE_SIZE = 16
+_spectrumCache = OrderedDict()
+_spectrumLock = threading.Lock()
+
+# transforms for the fft engine (the numpy backend holds no state)
+_backend = None
+
+
+def _separate(kernel):
+    """
+    returns the (column, row) factors of a rank-1 kernel or None if the
+    kernel is not separable
+    """
+    u, s, vt = np.linalg.svd(kernel)
+    if s[0] == 0.0:
+        return None
+    if s.size > 1 and s[1] > s[0] * 1e-10:
+        return None
+    return u[:,0] * s[0], vt[0,:]
+
+
+def _select_engine(kernel, factors):
+    """
+    picks the cheapest engine for the given kernel
+    """
+    if factors is not None and min(kernel.shape) > 1 \
+            and sum(kernel.shape) < _FFT_MIN_TAPS:
+        return "separable"
+    if kernel.size >= _FFT_MIN_TAPS:
+        return "fft"
+    return "direct"
+
+
+def _correlate_taps(padded, taps, axis, acc, scratch):
+    """
+    accumulates the 1-D correlation of 'padded' with 'taps' along 'axis'
+    into 'acc', every tap is a strided view so nothing is allocated per tap
+    """
+    length = acc.shape[axis]
+    index = [slice(None)] * padded.ndim
+    acc.fill(0)
+    for offset, weight in enumerate(taps):
+        if weight == 0.0:
+            continue
+        index[axis] = slice(offset, offset + length)
+        np.multiply(padded[tuple(index)], weight, out=scratch)
+        np.add(acc, scratch, out=acc)
+
+
+def _correlate_direct(padded, kernel, acc, scratch):
+    """
+    accumulates the 2-D correlation of 'padded' with 'kernel' into 'acc'
+    using one sliding-window view per kernel tap
+    """
+    rows, cols = acc.shape[1], acc.shape[2]
+    acc.fill(0)
+    for (m, n), weight in np.ndenumerate(kernel):
+        if weight == 0.0:
+            continue
+        np.multiply(padded[:,m:m+rows,n:n+cols], weight, out=scratch)
+        np.add(acc, scratch, out=acc)
+
+
+def _correlate_separable(padded, factors, acc, workspace):
+    """
+    accumulates the correlation of 'padded' with a rank-1 kernel as a
+    vertical pass followed by a horizontal pass
+    """
+    column, row = factors
+    shape = acc.shape[:2] + padded.shape[2:]
+    vertical = workspace.buffer("filter2D.vertical", shape, acc.dtype)
+    verticalScratch = workspace.buffer("filter2D.scratch", shape, acc.dtype)
+    _correlate_taps(padded, column, 1, vertical, verticalScratch)
+    #the horizontal pass reuses the vertical scratch as its product buffer
+    _correlate_taps(vertical, row, 2, acc, verticalScratch[:,:,:acc.shape[2]])
+
+
+def _kernel_spectrum(kernel, shape, rowOffset, colOffset):
+    """
+    returns the (cached) half spectrum of 'kernel' laid out for a circular
+    correlation over a frame of the given shape
+    """
+    key = (kernel.tobytes(), kernel.dtype.str, kernel.shape, shape, rowOffset, colOffset)
+    with _spectrumLock:
+        spectrum = _spectrumCache.get(key)
+        if spectrum is not None:
+            _spectrumCache.move_to_end(key)
+            return spectrum
+
+    m, n = np.indices(kernel.shape)
+    impulse = np.zeros(shape, dtype=kernel.dtype)
+    np.add.at(impulse,
+              ((rowOffset - m) % shape[0], (colOffset - n) % shape[1]),
+              kernel)
+    spectrum = np.fft.rfft2(impulse)
+
+    with _spectrumLock:
+        _spectrumCache[key] = spectrum
+        while len(_spectrumCache) > _SPECTRUM_CACHE_SIZE:
+            _spectrumCache.popitem(last=False)
+    return spectrum
+
+
+def _correlate_fft(frame, kernel, rowOffset, colOffset, acc, workspace):
+    """
+    circular correlation of 'frame' with 'kernel' computed in the frequency
+    domain, the leading rows and columns of the result are written into 'acc'
+    """
+    global _backend
+    if _backend is None:
+        _backend = ipcv.FFTBackend("numpy")
+
+    number, rows, cols, bands = frame.shape
+    spectrum = _kernel_spectrum(kernel, (rows, cols), rowOffset, colOffset)
+
+    freq = workspace.buffer("filter2D.freq",
+                            (number, rows, cols//2 + 1, bands),
+                            np.result_type(acc.dtype, ipcv.IPCV_64C))
+    _backend.rfft2(frame, axes=(1,2), out=freq)
+    freq *= spectrum[np.newaxis,:,:,np.newaxis]
+    if acc.shape == frame.shape:
+        _backend.irfft2(freq, (rows, cols), axes=(1,2), out=acc)
+    else:
+        spatial = workspace.buffer("filter2D.spatial", frame.shape, acc.dtype)
+        _backend.irfft2(freq, (rows, cols), axes=(1,2), out=spatial)
+        acc[...] = spatial[:,:acc.shape[1],:acc.shape[2]]
+
+
+def filter2D(src, dstDepth, kernel, delta=0, maxCount=255, engine="auto", borderType=ipcv.BORDER_WRAP,
+             batch=False, accDepth=ipcv.IPCV_64F, dst=None, workspace=None):
     """
     :NAME:
         filter2D
@@ -9,13 +152,29 @@ def filter2D(src, dstDepth, kernel, delta=0, maxCount=255):
     :PURPOSE:
         this method applies a spatial filter to an image
 
+        the kernel is correlated with the image (anchored at the kernel
+        center) using one of three engines:
+            "separable" -- rank-1 kernels are applied as two 1-D passes
+            "fft" -- large kernels are applied in the frequency domain,
+                the kernel spectrum is cached between calls
+            "direct" -- small dense kernels are applied tap by tap over
+                sliding-window views of the image
+        "auto" picks the cheapest engine for the kernel
+
+        pixels outside of the image are extrapolated according to
+        'borderType', the image is padded once into a scratch buffer
+
+        every band of every image in a batch is filtered in the same
+        vectorized pass
 
     :CATEGORY:
         ipcv -- spatial filtering and modification tool
 
     :INPUTS:
         src
-            [numpy.ndarray] input image
+            [numpy.ndarray] input image, (rows,cols) or (rows,cols,bands),
+            or a stack of images (n,rows,cols) or (n,rows,cols,bands) when
+            'batch' is True
         dstDepth
             [IPCV type] the dtype of the dst array
         kernel
@@ -24,9 +183,26 @@ def filter2D(src, dstDepth, kernel, delta=0, maxCount=255):
             [int,float] offset to be added to the image
         maxCount
             [int] maximum value of the output image
+        engine
+            [string] one of "auto", "direct", "separable" or "fft"
+        borderType
+            [int] one of the ipcv.BORDER_* constants (zeros are used
+            outside of the image for ipcv.BORDER_CONSTANT)
+        batch
+            [boolean] whether the first axis of 'src' indexes images
+        accDepth
+            [IPCV type] ipcv.IPCV_64F or ipcv.IPCV_32F, the precision used
+            for accumulation (IPCV_32F halves the memory traffic)
+        dst
+            [numpy.ndarray] optional output array with the shape of 'src'
+            and the dtype 'dstDepth', the result is written into it
+        workspace
+            [ipcv.Workspace] optional owner of the scratch buffers, with a
+            workspace and a 'dst' array repeated calls on frames of the
+            same shape allocate no full-frame arrays
 
     :RETURN VALUE:
-        filtered image in the form of a numpy.ndarray 
+        filtered image in the form of a numpy.ndarray
 
     :ERROR CHECKING:
         ValueError
@@ -41,40 +217,102 @@ def filter2D(src, dstDepth, kernel, delta=0, maxCount=255):
 
     """
     #ERROR CHECKING
-    ipcv.type_check(src,np.ndarray,"src")
+    ipcv.type_check(src,(np.ndarray,),"src")
     # ipcv.type_check(dstDepth, ipcv.IPCV_TYPES,"dstDepth")
-    ipcv.type_check(kernel,np.ndarray,"kernel")
+    ipcv.type_check(kernel,(np.ndarray,),"kernel")
     ipcv.type_check(delta, (int,float), "delta")
     ipcv.type_check(maxCount,(int,float),"maxCount")
-    ipcv.value_check(maxCount,'b', (0,':'), "maxCount")
+    ipcv.value_check(maxCount,(0,':'),'b', "maxCount")
+    ipcv.value_check(engine,FILTER2D_ENGINES,'d',"engine")
+    ipcv.value_check(borderType,ipcv.BORDER_TYPES,'d',"borderType")
+    ipcv.value_check(kernel.ndim,2,'e',"kernel.ndim")
+    ipcv.type_check(batch,(bool,),"batch")
+    ipcv.value_check(src.ndim,(3,4) if batch else (2,3),'d',"src.ndim")
+    ipcv.value_check(accDepth,FILTER2D_ACC_DEPTHS,'d',"accDepth")
+    if dst is not None:
+        ipcv.type_check(dst,(np.ndarray,),"dst")
+        ipcv.value_check(dst.shape,(src.shape,),'d',"dst.shape")
+        ipcv.value_check(dst.dtype,(np.dtype(dstDepth),),'d',"dst.dtype")
+    if workspace is None:
+        workspace = ipcv.Workspace()
+    ipcv.type_check(workspace,(ipcv.Workspace,),"workspace")
 
-    try:
-        
-        #Converting to float64 (only if necessary)
-        if src.dtype != ipcv.IPCV_64F:
-            src = src.astype(ipcv.IPCV_64F)
-        if kernel.dtype != ipcv.IPCV_64F:
-            kernel = kernel.astype(ipcv.IPCV_64F)
+    #Normalizing the kernel
+    kernel = kernel.astype(ipcv.IPCV_64F)
+    weight = np.sum(kernel)
+    weight = 1.0 if weight == 0.0 else weight
+    kernel = kernel / weight
 
-        #Normalizing the kernel
-        weight = np.sum(kernel)
-        weight = 1.0 if weight == 0.0 else weight
-        kernel = kernel / weight
+    factors = _separate(kernel)
+    kernel = kernel.astype(accDepth)
+    if engine == "auto":
+        engine = _select_engine(kernel, factors)
+    elif engine == "separable" and factors is None:
+        print("-----------------------------------------------------------")
+        print("                       VALUE ERROR                       \n")
+        print("the 'separable' engine requires a rank-1 kernel")
+        print("\n-----------------------------------------------------------")
+        raise ValueError
+    if factors is not None:
+        factors = (factors[0].astype(accDepth), factors[1].astype(accDepth))
 
-        dst = np.zeros(src.shape)
+    try:
+        #working on a (batch,rows,cols,bands) view of the image
+        image = src if batch else src[np.newaxis]
+        if image.ndim == 3:
+            image = image[...,np.newaxis]
+        number, rows, cols, bands = image.shape
 
         rowOffset = kernel.shape[0] // 2
         colOffset = kernel.shape[1] // 2
-        
-        src = np.roll(src,rowOffset, axis=0)
-        src = np.roll(src,colOffset, axis=1)
-        for element in range(kernel.size):
-            dst = dst + (src * kernel.flat[element])
-            src = np.roll(src, -1, axis = (element % 2) )
 
+        #accumulating straight into the output when it has the working
+        #precision, otherwise into a scratch buffer that is cast at the end
+        if dst is not None and dst.dtype == accDepth and dst.flags.c_contiguous:
+            acc = dst.reshape(image.shape)
+        elif dst is None and np.dtype(dstDepth) == accDepth:
+            acc = np.empty(image.shape, dtype=accDepth)
+        else:
+            acc = workspace.buffer("filter2D.acc", image.shape, accDepth)
+
+        if engine == "fft" and borderType == ipcv.BORDER_WRAP:
+            #a circular correlation already wraps, no padding required
+            frame = image
+            if frame.dtype != accDepth:
+                frame = workspace.buffer("filter2D.padded", image.shape, accDepth)
+                frame[...] = image
+            _correlate_fft(frame, kernel, rowOffset, colOffset, acc, workspace)
+        else:
+            paddedShape = ( number,
+                            rows + kernel.shape[0] - 1,
+                            cols + kernel.shape[1] - 1,
+                            bands )
+            padded = ipcv.copy_make_border(image,
+                                           rowOffset,
+                                           kernel.shape[0] - 1 - rowOffset,
+                                           colOffset,
+                                           kernel.shape[1] - 1 - colOffset,
+                                           borderType,
+                                           dst=workspace.buffer("filter2D.padded", paddedShape, acc.dtype),
+                                           axes=(1,2))
+            if engine == "fft":
+                _correlate_fft(padded, kernel, 0, 0, acc, workspace)
+            else:
+                if engine == "separable":
+                    _correlate_separable(padded, factors, acc, workspace)
+                else:
+                    scratch = workspace.buffer("filter2D.product", acc.shape, acc.dtype)
+                    _correlate_direct(padded, kernel, acc, scratch)
+
+        if delta > 0.0:
+            acc += delta
+        np.clip(acc, 0, maxCount, out=acc)
 
-        dst = np.clip(dst + delta,0,maxCount) if (delta>0.0) else np.clip(dst,0,maxCount)
-        return dst.astype(dstDepth) 
+        if dst is None:
+            return acc.reshape(src.shape).astype(dstDepth, copy=False)
+        if not np.shares_memory(acc, dst):
+            np.copyto(dst, acc.reshape(src.shape), casting='unsafe')
+        return dst
 
     except Exception as e:
         ipcv.debug(e)
@@ -107,9 +345,10 @@ if __name__ == '__main__':
     # kernel = np.asarray([[1,1,1],[1,1,1],[1,1,1]])
     # offset = 0
 
-    startTime = time.time()
-    dst = ipcv.filter2D(src, dstDepth, kernel, delta=offset)
-    print('Elapsed time = {0} [s]'.format(time.time() - startTime))
+    for engine in ("auto", "direct", "fft"):
+        startTime = time.time()
+        dst = ipcv.filter2D(src, dstDepth, kernel, delta=offset, engine=engine)
+        print('Elapsed time ({0}) = {1} [s]'.format(engine, time.time() - startTime))
 
     cv2.namedWindow(filename, cv2.WINDOW_AUTOSIZE)
     cv2.imshow(filename, src)
@@ -1,10 +1,13 @@
 import numpy as np
 import ipcv
 
-def filter_bandpass(img, radialCenter, bandwidth, order=1, filterShape=ipcv.IPCV_IDEAL):
+def filter_bandpass(img, radialCenter, bandwidth, order=1, filterShape=ipcv.IPCV_IDEAL, dtype=ipcv.IPCV_64F, halfSpectrum=False):
 	"""
 	:purpose:
 		generates a bandpass filter
+
+		the response is built and cached by ipcv.default_filter_bank(),
+		a writable copy is returned
 	:inputs:
 		img [np.ndarray]
 			'--> img to generate filter for
@@ -16,14 +19,24 @@ def filter_bandpass(img, radialCenter, bandwidth, order=1, filterShape=ipcv.IPCV
 			'--> order for butterworth filter
 		filterShape [int]
 			'--> type of filter to apply
+		dtype [numpy.dtype]
+			'--> ipcv.IPCV_64F (default) or ipcv.IPCV_32F
+		halfSpectrum [bool]
+			'--> return the (rows, cols//2+1) half of the filter in the
+				 unshifted rfft layout accepted by ipcv.frequency_filter
 	:return:
 		frequency filter [np.ndarray]
 
 	"""
 
-	bandReject = ipcv.filter_bandreject(img,radialCenter,bandwidth,order,filterShape)
-	bandPass = 1 - bandReject
-	return bandPass
+	try:
+		dims = ipcv.dimensions(img)
+		bank = ipcv.default_filter_bank()
+		bandPass = bank.bandpass(radialCenter, bandwidth, order, filterShape)
+		return bandPass.materialize( (dims["rows"], dims["cols"]), dtype, halfSpectrum ).copy()
+
+	except Exception as e:
+		ipcv.debug(e)
 
 if __name__ == '__main__':
 	import cv2
@@ -1,10 +1,13 @@
 import numpy as np
 import ipcv
 
-def filter_bandreject(img, radialCenter, bandwidth, order=1, filterShape=ipcv.IPCV_IDEAL):
+def filter_bandreject(img, radialCenter, bandwidth, order=1, filterShape=ipcv.IPCV_IDEAL, dtype=ipcv.IPCV_64F, halfSpectrum=False):
 	"""
 	:purpose:
 		generates a bandreject filter
+
+		the response is built and cached by ipcv.default_filter_bank(),
+		a writable copy is returned
 	:inputs:
 		img [np.ndarray]
 			'--> img to generate filter for
@@ -16,6 +19,11 @@ def filter_bandreject(img, radialCenter, bandwidth, order=1, filterShape=ipcv.IP
 			'--> order for butterworth filter
 		filterShape [int]
 			'--> type of filter to apply
+		dtype [numpy.dtype]
+			'--> ipcv.IPCV_64F (default) or ipcv.IPCV_32F
+		halfSpectrum [bool]
+			'--> return the (rows, cols//2+1) half of the filter in the
+				 unshifted rfft layout accepted by ipcv.frequency_filter
 	:return:
 		frequency filter [np.ndarray]
 
@@ -23,30 +31,9 @@ def filter_bandreject(img, radialCenter, bandwidth, order=1, filterShape=ipcv.IP
 
 	try:
 		dims = ipcv.dimensions(img)
-		r = dims["rows"]
-		c = dims["cols"]
-		u = np.arange(r)
-		v = np.arange(c)
-		u, v = np.meshgrid(u, v)
-		D = np.sqrt( (u-r/2)**2 + (v-c/2)**2 )
-
-		if filterShape == ipcv.IPCV_IDEAL:
-			D[ D < (radialCenter - bandwidth/2) ] = 1
-			D[ D >= (radialCenter + bandwidth/2) ] = 1
-			D[ D != 1] = 0
-
-
-		elif filterShape == ipcv.IPCV_GAUSSIAN:
-			xp = -.5 * ((D**2 - radialCenter**2) / (D * bandwidth))**2
-			D = 1 - np.exp( xp )
-			D = np.clip(D,0,1)
-
-
-		elif filterShape == ipcv.IPCV_BUTTERWORTH:
-			denom = 1.0 + ( (D * bandwidth) / (D**2 - radialCenter**2))**(2*order)
-			D = 1.0 / denom
-
-		return D
+		bank = ipcv.default_filter_bank()
+		bandReject = bank.bandreject(radialCenter, bandwidth, order, filterShape)
+		return bandReject.materialize( (dims["rows"], dims["cols"]), dtype, halfSpectrum ).copy()
 
 	except Exception as e:
 		ipcv.debug(e)
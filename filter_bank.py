@@ -0,0 +1,284 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import ipcv
+
+FILTER_BANK_DTYPES = (ipcv.IPCV_32F, ipcv.IPCV_64F)
+
+
+def _lowpass(D, cutoffFrequency, order, filterShape):
+	"""
+	lowpass transfer function from a radial distance grid, the ideal
+	filter passes D <= cutoffFrequency (the original filter_lowpass also
+	passed D == cutoffFrequency, but zeroed the whole filter for cutoffs
+	of 1 or less through its second in place comparison)
+	"""
+	if filterShape == ipcv.IPCV_IDEAL:
+		return (D <= cutoffFrequency).astype(ipcv.IPCV_64F)
+
+	elif filterShape == ipcv.IPCV_GAUSSIAN:
+		return np.exp( -1*(D**2) / (2* cutoffFrequency**2) )
+
+	elif filterShape == ipcv.IPCV_BUTTERWORTH:
+		return 1.0 / ( 1.0 + (D / cutoffFrequency)**(2 * order) )
+
+
+def _bandreject(D, radialCenter, bandwidth, order, filterShape):
+	"""
+	bandreject transfer function from a radial distance grid
+	"""
+	with np.errstate(divide='ignore', invalid='ignore'):
+		if filterShape == ipcv.IPCV_IDEAL:
+			H = (D < (radialCenter - bandwidth/2)) | (D >= (radialCenter + bandwidth/2))
+			return H.astype(ipcv.IPCV_64F)
+
+		elif filterShape == ipcv.IPCV_GAUSSIAN:
+			xp = -.5 * ((D**2 - radialCenter**2) / (D * bandwidth))**2
+			return np.clip(1 - np.exp( xp ), 0, 1)
+
+		elif filterShape == ipcv.IPCV_BUTTERWORTH:
+			return 1.0 / ( 1.0 + ( (D * bandwidth) / (D**2 - radialCenter**2))**(2*order) )
+
+
+def _notchreject(D1, D2, notchRadius, order, filterShape):
+	"""
+	notch reject transfer function from the distance grids to the notch
+	and to its mirror image
+	"""
+	with np.errstate(divide='ignore'):
+		if filterShape == ipcv.IPCV_IDEAL:
+			H = (D1 > notchRadius) & (D2 > notchRadius)
+			return H.astype(ipcv.IPCV_64F)
+
+		elif filterShape == ipcv.IPCV_GAUSSIAN:
+			return 1 - np.exp( -.5 * ( (D1 * D2)/(notchRadius**2) ) )
+
+		elif filterShape == ipcv.IPCV_BUTTERWORTH:
+			return 1 / ( 1 + ( (notchRadius**2) / (D1 * D2) )**order )
+
+
+class TransferFunction(object):
+	"""
+	:purpose:
+		lazily evaluated frequency domain filter produced by a FilterBank
+
+		transfer functions do not depend on an image size, they combine
+		with each other and with scalars (+, -, *) into new transfer
+		functions and the response is only computed, and memoized by the
+		bank, when it is materialized for the (rows, cols) of an image
+		in a given dtype and layout
+	"""
+
+	def __init__(self, bank, key, evaluate):
+		self._bank = bank
+		self._key = key
+		self._evaluate = evaluate
+
+	@property
+	def key(self):
+		return self._key
+
+	def materialize(self, shape, dtype=ipcv.IPCV_64F, halfSpectrum=False, imageShape=None):
+		"""
+		:purpose:
+			returns the (read only) response for an image of shape
+			(rows, cols), building it on the first request only
+		:inputs:
+			shape [tuple]
+				'--> (rows, cols) of the image to be filtered
+			dtype [numpy.dtype]
+				'--> ipcv.IPCV_32F or ipcv.IPCV_64F
+			halfSpectrum [bool]
+				'--> return the (rows, cols//2+1) half of the response in
+					 the unshifted rfft layout instead of the centered
+					 (rows, cols) response
+			imageShape [tuple, None]
+				'--> (rows, cols) of the image the filter is designed for
+					 when it is larger than 'shape', the response of that
+					 image is then sampled on the coarser frequency grid
+					 of a 'shape' transform (used to filter it in tiles)
+		:return:
+			frequency filter [np.ndarray]
+		"""
+		ipcv.value_check(dtype,FILTER_BANK_DTYPES,'d',"dtype")
+		shape = tuple(shape[:2])
+		if imageShape is not None:
+			imageShape = tuple(imageShape[:2])
+			if imageShape == shape:
+				imageShape = None
+		layout = (shape, np.dtype(dtype), bool(halfSpectrum), imageShape)
+		return self._bank._memoize(self._key, layout, self._evaluate)
+
+	def _combine(self, op, ufunc, other, reflected=False):
+		if isinstance(other, TransferFunction):
+			otherKey = other.key
+			otherValue = other.materialize
+		else:
+			otherKey = float(other)
+			otherValue = lambda shape, dtype, halfSpectrum, imageShape: dtype.type(otherKey)
+
+		if reflected:
+			key = (op, otherKey, self._key)
+			evaluate = lambda layout: ufunc(otherValue(*layout), self.materialize(*layout))
+		else:
+			key = (op, self._key, otherKey)
+			evaluate = lambda layout: ufunc(self.materialize(*layout), otherValue(*layout))
+		return TransferFunction(self._bank, key, evaluate)
+
+	def __mul__(self, other):
+		return self._combine("mul", np.multiply, other)
+
+	def __rmul__(self, other):
+		return self._combine("mul", np.multiply, other, reflected=True)
+
+	def __add__(self, other):
+		return self._combine("add", np.add, other)
+
+	def __radd__(self, other):
+		return self._combine("add", np.add, other, reflected=True)
+
+	def __sub__(self, other):
+		return self._combine("sub", np.subtract, other)
+
+	def __rsub__(self, other):
+		return self._combine("sub", np.subtract, other, reflected=True)
+
+	def __neg__(self):
+		return self._combine("mul", np.multiply, -1.0)
+
+	def __repr__(self):
+		return "TransferFunction{0}".format(self._key)
+
+
+class FilterBank(object):
+	"""
+	:purpose:
+		builds and caches frequency domain filters
+
+		radial distance grids are cached per (rows, cols, notch offset) and
+		every materialized transfer function (including compositions) is
+		memoized by (type, shape, cutoff, order, filterShape, dtype,
+		layout), so a video loop that filters every frame with the same
+		filters only builds them once
+
+		responses are float64 and centered by default, float32 responses
+		in the half spectrum (rfft) layout that frequency_filter uses for
+		real images take about a quarter of the memory
+	:inputs:
+		maxFilters [int]
+			'--> number of materialized responses kept before the least
+				 recently used one is released
+		maxGrids [int]
+			'--> number of distance grids kept
+	"""
+
+	def __init__(self, maxFilters=32, maxGrids=8):
+		self._maxFilters = maxFilters
+		self._maxGrids = maxGrids
+		self._filters = OrderedDict()
+		self._grids = OrderedDict()
+		self._lock = threading.RLock()
+
+	@staticmethod
+	def _lru(cache, key, size, build):
+		value = cache.get(key)
+		if value is not None:
+			cache.move_to_end(key)
+			return value
+		value = build()
+		value.setflags(write=False)
+		cache[key] = value
+		while len(cache) > size:
+			cache.popitem(last=False)
+		return value
+
+	def distance(self, shape, offset=(0,0), halfSpectrum=False, imageShape=None):
+		"""
+		:purpose:
+			returns the (read only) grid of distances from the center of
+			the spectrum (offset by (u, v) columns and rows) for an image
+			of shape (rows, cols), 'halfSpectrum' returns the distances of
+			the unshifted rfft layout (rows, cols//2+1) instead
+
+			the center is the (rows//2, cols//2) bin of numpy.fft.fftshift,
+			so both layouts hold the same response for odd sizes too
+
+			distances are measured in frequency bins of an 'imageShape'
+			image (the grid itself when None)
+		"""
+		rows, cols = shape[0], shape[1]
+		uOffset, vOffset = offset
+		imageRows, imageCols = (rows, cols) if imageShape is None else imageShape[:2]
+
+		def build():
+			x = np.arange(cols)
+			y = np.arange(rows)
+			if halfSpectrum:
+				#index of every rfft bin in the centered spectrum
+				x = (x[:cols//2 + 1] + cols//2) % cols
+				y = (y + rows//2) % rows
+			u = (x - cols//2) * (imageCols / cols) - uOffset
+			v = (y[:,np.newaxis] - rows//2) * (imageRows / rows) - vOffset
+			return np.sqrt( u**2 + v**2 )
+
+		key = (rows, cols, uOffset, vOffset, halfSpectrum, imageRows, imageCols)
+		with self._lock:
+			return self._lru(self._grids, key, self._maxGrids, build)
+
+	def _distance(self, layout, offset=(0,0)):
+		shape, dtype, halfSpectrum, imageShape = layout
+		return self.distance(shape, offset, halfSpectrum, imageShape)
+
+	def _memoize(self, key, layout, evaluate):
+		shape, dtype, halfSpectrum, imageShape = layout
+		with self._lock:
+			return self._lru(self._filters, (key, shape, dtype.str, halfSpectrum, imageShape),
+			                 self._maxFilters, lambda: np.asarray(evaluate(layout), dtype=dtype))
+
+	def lowpass(self, cutoffFrequency, order=1, filterShape=ipcv.IPCV_IDEAL):
+		key = ("lowpass", cutoffFrequency, order, filterShape)
+		evaluate = lambda layout: _lowpass(self._distance(layout), cutoffFrequency, order, filterShape)
+		return TransferFunction(self, key, evaluate)
+
+	def highpass(self, cutoffFrequency, order=1, filterShape=ipcv.IPCV_IDEAL):
+		return 1 - self.lowpass(cutoffFrequency, order, filterShape)
+
+	def bandreject(self, radialCenter, bandwidth, order=1, filterShape=ipcv.IPCV_IDEAL):
+		key = ("bandreject", radialCenter, bandwidth, order, filterShape)
+		evaluate = lambda layout: _bandreject(self._distance(layout), radialCenter, bandwidth, order, filterShape)
+		return TransferFunction(self, key, evaluate)
+
+	def bandpass(self, radialCenter, bandwidth, order=1, filterShape=ipcv.IPCV_IDEAL):
+		return 1 - self.bandreject(radialCenter, bandwidth, order, filterShape)
+
+	def notchreject(self, notchCenter, notchRadius, order=1, filterShape=ipcv.IPCV_IDEAL):
+		uCenter, vCenter = notchCenter[0], notchCenter[1]
+		key = ("notchreject", (uCenter, vCenter), notchRadius, order, filterShape)
+		evaluate = lambda layout: _notchreject(self._distance(layout, (uCenter, vCenter)),
+		                                       self._distance(layout, (-uCenter, -vCenter)),
+		                                       notchRadius, order, filterShape)
+		return TransferFunction(self, key, evaluate)
+
+	def notchpass(self, notchCenter, notchRadius, order=1, filterShape=ipcv.IPCV_IDEAL):
+		return 1 - self.notchreject(notchCenter, notchRadius, order, filterShape)
+
+	def clear(self):
+		"""
+		releases every cached grid and response
+		"""
+		with self._lock:
+			self._filters.clear()
+			self._grids.clear()
+
+	def __len__(self):
+		return len(self._filters)
+
+
+_defaultBank = FilterBank()
+
+def default_filter_bank():
+	"""
+	:purpose:
+		returns the bank shared by the ipcv.filter_* builders
+	"""
+	return _defaultBank
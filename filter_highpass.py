@@ -1,10 +1,13 @@
 import numpy as np
 import ipcv
 
-def filter_highpass(img, cutoffFrequency, order=1, filterShape=ipcv.IPCV_IDEAL):
+def filter_highpass(img, cutoffFrequency, order=1, filterShape=ipcv.IPCV_IDEAL, dtype=ipcv.IPCV_64F, halfSpectrum=False):
 	"""
 	:purpose:
 		generates a highpass filter
+
+		the response is built and cached by ipcv.default_filter_bank(),
+		a writable copy is returned
 	:inputs:
 		img [np.ndarray]
 			'--> img to generate filter for
@@ -14,14 +17,20 @@ def filter_highpass(img, cutoffFrequency, order=1, filterShape=ipcv.IPCV_IDEAL):
 			'--> order for butterworth filter
 		filterShape
 			'--> type of filter to apply
+		dtype [numpy.dtype]
+			'--> ipcv.IPCV_64F (default) or ipcv.IPCV_32F
+		halfSpectrum [bool]
+			'--> return the (rows, cols//2+1) half of the filter in the
+				 unshifted rfft layout accepted by ipcv.frequency_filter
 	:return:
 		frequency filter [np.ndarray]
 
 	"""
 	try:
-		lowPass = ipcv.filter_lowpass(img,cutoffFrequency,order,filterShape)
-		highPass = 1 - lowPass
-		return highPass
+		dims = ipcv.dimensions(img)
+		bank = ipcv.default_filter_bank()
+		highPass = bank.highpass(cutoffFrequency, order, filterShape)
+		return highPass.materialize( (dims["rows"], dims["cols"]), dtype, halfSpectrum ).copy()
 
 	except Exception as e:
 		ipcv.debug(e)
@@ -1,10 +1,13 @@
 import numpy as np
 import ipcv
 import cv2
-def filter_lowpass(img, cutoffFrequency, order=1, filterShape=ipcv.IPCV_IDEAL):
+def filter_lowpass(img, cutoffFrequency, order=1, filterShape=ipcv.IPCV_IDEAL, dtype=ipcv.IPCV_64F, halfSpectrum=False):
 	"""
 	:purpose:
 		generates a lowpass filter
+
+		the response is built and cached by ipcv.default_filter_bank(),
+		a writable copy is returned
 	:inputs:
 		img [np.ndarray]
 			'--> img to generate filter for
@@ -14,6 +17,11 @@ def filter_lowpass(img, cutoffFrequency, order=1, filterShape=ipcv.IPCV_IDEAL):
 			'--> order for butterworth filter
 		filterShape
 			'--> type of filter to apply
+		dtype [numpy.dtype]
+			'--> ipcv.IPCV_64F (default) or ipcv.IPCV_32F
+		halfSpectrum [bool]
+			'--> return the (rows, cols//2+1) half of the filter in the
+				 unshifted rfft layout accepted by ipcv.frequency_filter
 	:return:
 		frequency filter [np.ndarray]
 
@@ -21,28 +29,9 @@ def filter_lowpass(img, cutoffFrequency, order=1, filterShape=ipcv.IPCV_IDEAL):
 
 	try:
 		dims = ipcv.dimensions(img)
-		r = dims["rows"]
-		c = dims["cols"]
-		u = np.arange(r)
-		v = np.arange(c)
-		u, v = np.meshgrid(u, v)
-		lowPass = np.sqrt( (u-r/2)**2 + (v-c/2)**2 )
-
-		if filterShape == ipcv.IPCV_IDEAL:
-			lowPass[lowPass <= cutoffFrequency] = 1
-			lowPass[lowPass >= cutoffFrequency] = 0
-
-		elif filterShape == ipcv.IPCV_GAUSSIAN:
-			xp = -1*(lowPass**2) / (2* cutoffFrequency**2)
-			lowPass = np.exp( xp )
-			lowPass = np.clip(lowPass,0,1)
-
-		elif filterShape == ipcv.IPCV_BUTTERWORTH:
-			denom = 1.0 + (lowPass / cutoffFrequency)**(2 * order)
-			lowPass = 1.0 / denom
-			
-
-		return lowPass
+		bank = ipcv.default_filter_bank()
+		lowPass = bank.lowpass(cutoffFrequency, order, filterShape)
+		return lowPass.materialize( (dims["rows"], dims["cols"]), dtype, halfSpectrum ).copy()
 
 	except Exception as e:
 		ipcv.debug(e)
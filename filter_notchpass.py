@@ -2,10 +2,13 @@ import numpy as np
 import ipcv
 
 
-def filter_notchpass(img, notchCenter, notchRadius, order=1, filterShape=ipcv.IPCV_IDEAL):
+def filter_notchpass(img, notchCenter, notchRadius, order=1, filterShape=ipcv.IPCV_IDEAL, dtype=ipcv.IPCV_64F, halfSpectrum=False):
 	"""
 	:purpose:
 		generates a notch reject filter
+
+		the response is built and cached by ipcv.default_filter_bank(),
+		a writable copy is returned
 	:inputs:
 		img [np.ndarray]
 			'--> img to generate filter for
@@ -15,13 +18,23 @@ def filter_notchpass(img, notchCenter, notchRadius, order=1, filterShape=ipcv.IP
 			'--> radius of the notch
 		filterShape
 			'--> type of filter to apply
+		dtype [numpy.dtype]
+			'--> ipcv.IPCV_64F (default) or ipcv.IPCV_32F
+		halfSpectrum [bool]
+			'--> return the (rows, cols//2+1) half of the filter in the
+				 unshifted rfft layout accepted by ipcv.frequency_filter
 	:return:
 		frequency filter [np.ndarray]
 
 	"""
-	notchReject = ipcv.filter_notchreject(img,notchCenter,notchRadius,order,filterShape)
-	notchPass = 1 - notchReject
-	return notchPass
+	try:
+		dims = ipcv.dimensions(img)
+		bank = ipcv.default_filter_bank()
+		notchPass = bank.notchpass(notchCenter, notchRadius, order, filterShape)
+		return notchPass.materialize( (dims["rows"], dims["cols"]), dtype, halfSpectrum ).copy()
+
+	except Exception as e:
+		ipcv.debug(e)
 
 
 if __name__ == '__main__':
@@ -2,10 +2,13 @@ import numpy as np
 import ipcv
 
 
-def filter_notchreject(img, notchCenter, notchRadius, order=1, filterShape=ipcv.IPCV_IDEAL):
+def filter_notchreject(img, notchCenter, notchRadius, order=1, filterShape=ipcv.IPCV_IDEAL, dtype=ipcv.IPCV_64F, halfSpectrum=False):
 	"""
 	:purpose:
 		generates a notch reject filter
+
+		the response is built and cached by ipcv.default_filter_bank(),
+		a writable copy is returned
 	:inputs:
 		img [np.ndarray]
 			'--> img to generate filter for
@@ -15,6 +18,11 @@ def filter_notchreject(img, notchCenter, notchRadius, order=1, filterShape=ipcv.
 			'--> radius of the notch
 		filterShape
 			'--> type of filter to apply
+		dtype [numpy.dtype]
+			'--> ipcv.IPCV_64F (default) or ipcv.IPCV_32F
+		halfSpectrum [bool]
+			'--> return the (rows, cols//2+1) half of the filter in the
+				 unshifted rfft layout accepted by ipcv.frequency_filter
 	:return:
 		frequency filter [np.ndarray]
 
@@ -23,33 +31,9 @@ def filter_notchreject(img, notchCenter, notchRadius, order=1, filterShape=ipcv.
 
 	try:
 		dims = ipcv.dimensions(img)
-		r = dims["rows"]
-		c = dims["cols"]
-		u = np.arange(r)
-		v = np.arange(c)
-		u, v = np.meshgrid(u, v)
-
-		uCenter = notchCenter[0]
-		vCenter = notchCenter[1]
-
-		D1 = np.sqrt( (u-r/2-uCenter)**2 + (v-c/2-vCenter)**2 ) 
-		D2 = np.sqrt( (u-r/2+uCenter)**2 + (v-c/2+vCenter)**2 ) 
-
-
-		if filterShape == ipcv.IPCV_IDEAL:
-			H = np.zeros( (r,c) )
-			H[D1 <= notchRadius] = 1
-			H[D2 <= notchRadius] = 1
-
-		elif filterShape == ipcv.IPCV_GAUSSIAN:
-			xp = -.5 * ( (D1 * D2)/(notchRadius**2) )
-			H = 1 - np.exp( xp )
-
-		elif filterShape == ipcv.IPCV_BUTTERWORTH:
-			denom = 1 + ( (notchRadius**2) / (D1 * D2) )**order
-			H = 1 / denom
-
-		return H
+		bank = ipcv.default_filter_bank()
+		notchReject = bank.notchreject(notchCenter, notchRadius, order, filterShape)
+		return notchReject.materialize( (dims["rows"], dims["cols"]), dtype, halfSpectrum ).copy()
 
 	except Exception as e:
 		ipcv.debug(e)
@@ -1,43 +1,164 @@
+import threading
+from collections import OrderedDict
 import numpy as np
 import ipcv
 
-def frequency_filter(img, frequencyFilter, delta=0):
+# (-1)**(x+y) shifters are cached by shape, read only
+_SHIFTER_CACHE_SIZE = 8
+_shifters = OrderedDict()
+_shifterLock = threading.Lock()
+
+# numpy backend used when none is supplied (it holds no state)
+_defaultBackend = None
+
+
+def _shifter(rows, cols):
+	"""
+	returns the cached (rows,cols,1) array of (-1)**(x+y) that centers the
+	spectrum of an image
+	"""
+	key = (rows, cols)
+	with _shifterLock:
+		shifter = _shifters.get(key)
+		if shifter is not None:
+			_shifters.move_to_end(key)
+			return shifter
+
+	shifter = np.ones( (rows,cols,1) )
+	shifter[1::2,0::2] = -1
+	shifter[0::2,1::2] = -1
+	shifter.setflags(write=False)
+
+	with _shifterLock:
+		_shifters[key] = shifter
+		while len(_shifters) > _SHIFTER_CACHE_SIZE:
+			_shifters.popitem(last=False)
+	return shifter
+
+
+def _half_spectrum(frequencyFilter, rows, cols, workspace):
+	"""
+	returns the filter in the (unshifted) rfft layout of a (rows,cols)
+	image, centered full size filters are rearranged into a workspace
+	buffer with slice copies only
+	"""
+	halfCols = cols//2 + 1
+	if frequencyFilter.shape == (rows, halfCols) and frequencyFilter.shape != (rows, cols):
+		return frequencyFilter
+
+	half = workspace.buffer("frequency_filter.half", (rows,halfCols), frequencyFilter.dtype)
+	r2 = rows//2
+	c2 = cols//2
+	#columns c2.. hold the non-negative frequencies, the last one wraps
+	#around to column 0 for even widths
+	n = min(halfCols, cols - c2)
+	half[:rows-r2,:n] = frequencyFilter[r2:,c2:c2+n]
+	half[rows-r2:,:n] = frequencyFilter[:r2,c2:c2+n]
+	if n < halfCols:
+		half[:rows-r2,n] = frequencyFilter[r2:,0]
+		half[rows-r2:,n] = frequencyFilter[:r2,0]
+	return half
+
+
+def frequency_filter(img, frequencyFilter, delta=0, out=None, workspace=None, backend=None):
 	"""
 	:purpose:
 		applies a frequency filter to an image
+
+		real images are filtered with real transforms (rfft2/irfft2) and
+		the half of the filter that they need, complex images go through
+		full complex transforms of the image shifted by a cached
+		(-1)**(x+y) array when both dimensions are even, and of the image
+		itself with the unshifted filter otherwise (the shifter only moves
+		the spectrum by whole bins for even sizes)
+
+		centered filters have their zero frequency at (rows//2, cols//2),
+		as numpy.fft.fftshift, so every path gives the same result
 	:inputs:
 		img [np.ndarray]
 			'--> image to be filtered
-		frequencyFilter [np.ndarray]
-			'--> filter to apply to image
+		frequencyFilter [np.ndarray, ipcv.TransferFunction]
+			'--> float32 or float64 filter to apply to image, either
+				 centered (rows,cols) or in the unshifted rfft layout
+				 (rows,cols//2+1) produced by the filter_* builders with
+				 halfSpectrum=True, transfer functions are materialized
+				 for the image size here
 		delta [int]
 			'--> offset to be added to image at the end
+		out [np.ndarray]
+			'--> optional float64 array with the shape of 'img' that
+				 receives the filtered image
+		workspace [ipcv.Workspace]
+			'--> optional owner of the intermediate buffers, with a
+				 workspace and 'out' repeated calls allocate no new frames
+		backend [ipcv.FFTBackend]
+			'--> FFT library to use (numpy by default)
 	:return:
-		filtered image
+		filtered image [np.ndarray] (float64)
 	"""
+	global _defaultBackend
+
+	#ERROR CHECKING
+	ipcv.type_check(img,(np.ndarray,),"img")
+	ipcv.type_check(frequencyFilter,(np.ndarray,ipcv.TransferFunction),"frequencyFilter")
+	if out is None:
+		out = np.empty(img.shape, dtype=ipcv.IPCV_64F)
+	ipcv.type_check(out,(np.ndarray,),"out")
+	ipcv.value_check(out.shape,(img.shape,),'d',"out.shape")
+	ipcv.value_check(out.dtype,(np.dtype(ipcv.IPCV_64F),),'d',"out.dtype")
+	ipcv.value_check(out.flags.c_contiguous,True,'e',"out.flags.c_contiguous")
+	if workspace is None:
+		workspace = ipcv.Workspace()
+	ipcv.type_check(workspace,(ipcv.Workspace,),"workspace")
+	if backend is None:
+		if _defaultBackend is None:
+			_defaultBackend = ipcv.FFTBackend("numpy")
+		backend = _defaultBackend
+	ipcv.type_check(backend,(ipcv.FFTBackend,),"backend")
+
 	try:
-		#generating deep copy
-		img = img.copy()
 		rows,cols,bands,_ = ipcv.dimensions(img,'t')
-		#preparing freq and filter arrays
-		freqFiltered = np.zeros( (rows,cols,bands) ).astype(ipcv.IPCV_128C)
-		spatialFiltered = np.zeros( (rows,cols,bands) ).astype(ipcv.IPCV_128C)
-		x,y = np.indices( (rows,cols) )
-		shifter = (-1)**(x+y)
-		
-		#making image 3D if necessary for computational ese
-		if len(img.shape) == 2:
-			img = img.reshape( (rows,cols,1) )
-
-		for band in range(bands):
-			#shifting image band by band
-			spatial = (img[:,:,band] * shifter).copy()
-			fft = np.fft.fft2(spatial)
-			#applying frequency filter
-			freqFiltered[:,:,band] = fft * frequencyFilter
-			spatialFiltered[:,:,band] = np.abs( np.fft.ifft2(freqFiltered[:,:,band]) ) * shifter
-
-		return (spatialFiltered + delta)
+		evenShape = (rows % 2 == 0) and (cols % 2 == 0)
+		if isinstance(frequencyFilter, ipcv.TransferFunction):
+			halfSpectrum = np.isrealobj(img)
+			frequencyFilter = frequencyFilter.materialize( (rows,cols), halfSpectrum=halfSpectrum )
+
+		#working on 3D views for computational ease
+		image = img.reshape( (rows,cols,bands) )
+		filtered = out.reshape( (rows,cols,bands) )
+
+		if np.isrealobj(image):
+			#real transforms of every band at once, the image is staged
+			#in the output array so that integer images are not copied
+			half = _half_spectrum(frequencyFilter, rows, cols, workspace)
+			freq = workspace.buffer("frequency_filter.rfreq", (rows,cols//2 + 1,bands), ipcv.IPCV_128C)
+			filtered[...] = image
+			backend.rfft2(filtered, axes=(0,1), out=freq)
+			freq *= half[:,:,np.newaxis]
+			backend.irfft2(freq, (rows,cols), axes=(0,1), out=filtered)
+
+		elif not evenShape:
+			freq = workspace.buffer("frequency_filter.freq", (rows,cols,bands), ipcv.IPCV_128C)
+			freq[...] = image
+			backend.fft2(freq, axes=(0,1), out=freq)
+			freq *= np.fft.ifftshift(frequencyFilter)[:,:,np.newaxis]
+			backend.ifft2(freq, axes=(0,1), out=freq)
+			np.copyto(filtered, freq.real)
+
+		else:
+			#shifting every band straight into the complex buffer, the
+			#transforms are then computed in place
+			shifter = _shifter(rows, cols)
+			freq = workspace.buffer("frequency_filter.freq", (rows,cols,bands), ipcv.IPCV_128C)
+			np.multiply(image, shifter, out=freq)
+			backend.fft2(freq, axes=(0,1), out=freq)
+			freq *= frequencyFilter[:,:,np.newaxis]
+			backend.ifft2(freq, axes=(0,1), out=freq)
+			np.multiply(freq.real, shifter, out=filtered)
+
+		if delta != 0:
+			filtered += delta
+		return out
 
 	except Exception as e:
 		ipcv.debug(e)
@@ -0,0 +1,198 @@
+import numpy as np
+import ipcv
+
+# bytes held per pixel of a transform and per band (real block, half
+# complex spectrum and the block read from the source) plus the half
+# filter, used to size the tiles from the memory budget
+_BLOCK_BYTES = 16
+_FILTER_BYTES = 4
+
+# whole images are filtered in one piece when their complex spectrum
+# (32 bytes per pixel and band in frequency_filter) fits in the budget
+_WHOLE_IMAGE_BYTES = 32
+
+
+def _fast_length(limit):
+	"""
+	largest even transform length <= limit whose only prime factors are
+	2, 3 and 5
+	"""
+	for n in range(int(limit) - int(limit) % 2, 1, -2):
+		m = n
+		for p in (2, 3, 5):
+			while m % p == 0:
+				m //= p
+		if m == 1:
+			return n
+	return 0
+
+
+def _kernel_halo(halfFilter, size, tolerance):
+	"""
+	(rows, cols) half widths of the spatial kernel of 'halfFilter' that
+	hold all but 'tolerance' of its absolute mass
+	"""
+	kernel = np.abs( np.fft.irfft2(halfFilter, s=size) )
+	total = kernel.sum()
+	halo = []
+	for axis, length in enumerate(size):
+		mass = kernel.sum(axis=1-axis)
+		#folding the mass onto the distance from the kernel origin
+		distance = np.minimum( np.arange(length), length - np.arange(length) )
+		mass = np.bincount(distance, weights=mass)
+		tail = total - np.cumsum(mass)
+		halo.append( int(np.argmax(tail <= tolerance * total)) )
+	return tuple(halo)
+
+
+def frequency_filter_tiles(src, frequencyFilter, delta=0, memoryBudget=256*2**20, halo=None, tolerance=1e-4, borderType=ipcv.BORDER_WRAP, backend=None):
+	"""
+	:purpose:
+		streams an image through a frequency filter in tiles (overlap-save)
+		so that images larger than memory, such as numpy.memmap arrays,
+		can be filtered
+
+		the filter is sampled, for the full image, on the frequency grid of
+		a transform sized from 'memoryBudget', every transform filters a
+		tile together with a 'halo' of neighbouring pixels that covers the
+		spatial extent of the filter and only the tile is kept, so the
+		result matches ipcv.frequency_filter on the whole image (whose
+		border policy is ipcv.BORDER_WRAP) up to the kernel mass outside
+		of the halo
+
+		images whose spectrum fits in the budget are filtered in one piece
+	:inputs:
+		src [np.ndarray]
+			'--> image to be filtered, a numpy.memmap is only read one
+				 transform block at a time
+		frequencyFilter [ipcv.TransferFunction]
+			'--> filter to apply to the image (e.g. from
+				 ipcv.default_filter_bank()), it is materialized for the
+				 transform size
+		delta [int]
+			'--> offset to be added to every filtered tile
+		memoryBudget [int]
+			'--> approximate number of bytes used by the transforms
+		halo [int, tuple, None]
+			'--> (rows, cols) half width of the spatial kernel, estimated
+				 from the filter when None
+		tolerance [float]
+			'--> fraction of the absolute kernel mass that may fall
+				 outside of an estimated halo
+		borderType [int]
+			'--> one of the ipcv.BORDER_* constants, how the halo is filled
+				 beyond the image edges
+		backend [ipcv.FFTBackend]
+			'--> FFT library to use (numpy by default)
+	:return:
+		generator of (rowSlice, colSlice, tile) [slice, slice, np.ndarray]
+		in row major order, the float64 tile is a view into a reused
+		buffer that is only valid until the next tile is requested
+	"""
+
+	#ERROR CHECKING
+	ipcv.type_check(src,(np.ndarray,),"src")
+	ipcv.type_check(frequencyFilter,(ipcv.TransferFunction,),"frequencyFilter")
+	ipcv.value_check(borderType,ipcv.BORDER_TYPES,'d',"borderType")
+	ipcv.value_check(memoryBudget,(0,":"),'b',"memoryBudget")
+	if backend is None:
+		backend = ipcv.FFTBackend("numpy")
+	ipcv.type_check(backend,(ipcv.FFTBackend,),"backend")
+
+	rows,cols,bands,_ = ipcv.dimensions(src,'t')
+	tileShape = src.shape[2:]
+
+	if rows * cols * bands * _WHOLE_IMAGE_BYTES <= memoryBudget:
+		yield slice(0,rows), slice(0,cols), ipcv.frequency_filter(src, frequencyFilter, delta=delta, backend=backend)
+		return
+
+	#square transforms as large as the budget allows, but no larger than
+	#the image with its halo
+	size = _fast_length( np.sqrt(memoryBudget / (bands * _BLOCK_BYTES + _FILTER_BYTES)) )
+	if halo is None:
+		halfFilter = frequencyFilter.materialize( (size,size), halfSpectrum=True, imageShape=(rows,cols) )
+		halo = _kernel_halo(halfFilter, (size,size), tolerance)
+	elif np.isscalar(halo):
+		halo = (int(halo), int(halo))
+	rowHalo, colHalo = halo
+	size = ( min(size, _fast_length(rows + 2*rowHalo + 1) or size),
+	         min(size, _fast_length(cols + 2*colHalo + 1) or size) )
+	rowStep = size[0] - 2*rowHalo
+	colStep = size[1] - 2*colHalo
+	#tiles smaller than a quarter of the transform waste most of the work
+	if rowStep < min(size[0]//4, rows) or colStep < min(size[1]//4, cols):
+		print("-----------------------------------------------------------")
+		print("                       VALUE ERROR                       \n")
+		print("the filter's kernel (halo {0}) does not fit in a {1} transform,".format(halo,size))
+		print("increase 'memoryBudget' or reduce 'halo'")
+		print("\n-----------------------------------------------------------")
+		raise ValueError
+
+	halfFilter = frequencyFilter.materialize(size, halfSpectrum=True, imageShape=(rows,cols))
+	halfFilter = halfFilter[:,:,np.newaxis]
+	workspace = ipcv.Workspace()
+	block = workspace.buffer("frequency_filter_tiled.block", size + (bands,))
+	freq = workspace.buffer("frequency_filter_tiled.rfreq", (size[0],size[1]//2 + 1,bands), ipcv.IPCV_128C)
+
+	for rowStart in range(0, rows, rowStep):
+		rowSlice = slice(rowStart, min(rowStart + rowStep, rows))
+		rowIndex = ipcv.border_interpolate(np.arange(size[0]) + rowStart - rowHalo, rows, borderType)
+
+		for colStart in range(0, cols, colStep):
+			colSlice = slice(colStart, min(colStart + colStep, cols))
+			colIndex = ipcv.border_interpolate(np.arange(size[1]) + colStart - colHalo, cols, borderType)
+
+			#reading the block (only these pixels are paged in from a memmap)
+			data = src[np.ix_(np.maximum(rowIndex, 0), np.maximum(colIndex, 0))]
+			block[...] = data.reshape( size + (bands,) )
+			if borderType == ipcv.BORDER_CONSTANT:
+				block[rowIndex < 0] = 0
+				block[:,colIndex < 0] = 0
+
+			backend.rfft2(block, axes=(0,1), out=freq)
+			freq *= halfFilter
+			backend.irfft2(freq, size, axes=(0,1), out=block)
+
+			tile = block[rowHalo:rowHalo + rowSlice.stop - rowStart,
+			             colHalo:colHalo + colSlice.stop - colStart]
+			if delta != 0:
+				tile += delta
+			yield rowSlice, colSlice, tile.reshape( tile.shape[:2] + tileShape )
+
+
+def frequency_filter_tiled(src, frequencyFilter, delta=0, out=None, memoryBudget=256*2**20, halo=None, tolerance=1e-4, borderType=ipcv.BORDER_WRAP, backend=None):
+	"""
+	:purpose:
+		applies a frequency filter to an image that may be larger than
+		memory, tile by tile (see ipcv.frequency_filter_tiles)
+	:inputs:
+		src [np.ndarray]
+			'--> image to be filtered (e.g. a numpy.memmap)
+		frequencyFilter [ipcv.TransferFunction]
+			'--> filter to apply to the image
+		delta [int]
+			'--> offset to be added to image at the end
+		out [np.ndarray]
+			'--> optional array (e.g. a writable numpy.memmap) with the
+				 shape of 'src' that receives the filtered image
+		memoryBudget, halo, tolerance, borderType, backend
+			'--> see ipcv.frequency_filter_tiles
+	:return:
+		filtered image [np.ndarray]
+	"""
+
+	ipcv.type_check(src,(np.ndarray,),"src")
+	if out is None:
+		out = np.empty(src.shape, dtype=ipcv.IPCV_64F)
+	ipcv.type_check(out,(np.ndarray,),"out")
+	ipcv.value_check(out.shape,(src.shape,),'d',"out.shape")
+
+	try:
+		tiles = frequency_filter_tiles(src, frequencyFilter, delta, memoryBudget,
+		                               halo, tolerance, borderType, backend)
+		for rowSlice, colSlice, tile in tiles:
+			out[rowSlice,colSlice] = tile
+		return out
+
+	except Exception as e:
+		ipcv.debug(e)
@@ -1,46 +1,215 @@
-def harris(src, sigma=1, k=0.04):
+import numpy as np
+import ipcv
+import cv2
 
-	dxArray = np.asarray([0,0,0],
-						 [-1,0,1],
-						 [0,0,0])
-	dyArray = np.asarray()
+# the response is computed for strips of this many rows so that the
+# intermediate results stay in cache
+_STRIP_ROWS = 32
+
+
+def _gaussian_taps(sigma):
+	"""
+	normalized float32 1-D gaussian window spanning +/- 3 sigma
+	"""
+	radius = max(1, int(np.ceil(3 * sigma)))
+	x = np.arange(-radius, radius + 1, dtype=np.float64)
+	taps = np.exp( -x**2 / (2 * sigma**2) )
+	return (taps / taps.sum()).astype(np.float32)
+
+
+def _correlate(padded, taps, axis, out, scratch):
+	"""
+	correlates the (products,rows,cols) stack 'padded' with the symmetric
+	'taps' along 'axis' into 'out', the mirrored views are added before
+	they are weighted so that every pair of taps costs one multiply
+	"""
+	length = out.shape[axis]
+	radius = taps.size // 2
+	index = [slice(None)] * padded.ndim
+	def view(offset):
+		index[axis] = slice(offset, offset + length)
+		return padded[tuple(index)]
+
+	np.multiply(view(radius), taps[radius], out=out)
+	for offset in range(radius):
+		np.add(view(offset), view(taps.size - 1 - offset), out=scratch)
+		scratch *= taps[offset]
+		out += scratch
+
+
+def _strip_response(padded, top, bottom, taps, k, response, workspace):
+	"""
+	harris response of the rows [top, bottom) of the image, 'padded' holds
+	the image with a margin of the window radius plus one pixel
+	"""
+	span = taps.size - 1
+	height = bottom - top
+	rows = height + span
+	cols = padded.shape[1] - 2
+	strip = min(_STRIP_ROWS, response.shape[0])
+
+	#gradients and their products over the strip and the window margin
+	dx = workspace.buffer("harris.dx", (strip + span, cols), np.float32)[:rows]
+	dy = workspace.buffer("harris.dy", (strip + span, cols), np.float32)[:rows]
+	np.subtract(padded[top+1:top+1+rows,2:], padded[top+1:top+1+rows,:-2], out=dx)
+	np.subtract(padded[top+2:top+2+rows,1:-1], padded[top:top+rows,1:-1], out=dy)
+	dx *= 0.5
+	dy *= 0.5
+	products = workspace.buffer("harris.products", (3, strip + span, cols), np.float32)[:,:rows]
+	np.multiply(dx, dx, out=products[0])
+	np.multiply(dy, dy, out=products[1])
+	np.multiply(dx, dy, out=products[2])
+
+	#separable gaussian window, vertical then horizontal
+	vertical = workspace.buffer("harris.vertical", (3, strip, cols), np.float32)[:,:height]
+	scratch = workspace.buffer("harris.scratch", (3, strip, cols), np.float32)[:,:height]
+	tensor = workspace.buffer("harris.tensor", (3, strip, cols - span), np.float32)[:,:height]
+	_correlate(products, taps, 1, vertical, scratch)
+	_correlate(vertical, taps, 2, tensor, scratch[:,:,:cols - span])
+	xx, yy, xy = tensor
+
+	#det(M) - k*trace(M)**2
+	out = response[top:bottom]
+	trace = scratch[0,:,:cols - span]
+	np.multiply(xx, yy, out=out)
+	np.multiply(xy, xy, out=trace)
+	out -= trace
+	np.add(xx, yy, out=trace)
+	np.multiply(trace, trace, out=trace)
+	trace *= k
+	out -= trace
+
+
+def _suppress(response):
+	"""
+	mask of the pixels whose response is the largest of their 3x3
+	neighbourhood, ties go to the first pixel in raster order (the image
+	edge is never a maximum)
+	"""
+	rows, cols = response.shape
+	center = response[1:-1,1:-1]
+	keep = np.zeros( (rows,cols), dtype=bool )
+	maxima = keep[1:-1,1:-1]
+	np.greater(center, 0, out=maxima)
+	for dy in (-1,0,1):
+		for dx in (-1,0,1):
+			if dy == 0 and dx == 0:
+				continue
+			neighbour = response[1+dy:rows-1+dy, 1+dx:cols-1+dx]
+			if (dy, dx) < (0, 0):
+				maxima &= center > neighbour
+			else:
+				maxima &= center >= neighbour
+	return keep
+
+
+def harris(src, sigma=1, k=0.04, numberCorners=None, workspace=None):
+	"""
+	:purpose:
+		Harris corner response
+
+		the gradients (central differences) and the three structure tensor
+		products are computed in one pass over the image padded by the
+		gaussian window (ipcv.BORDER_REFLECT_101), the products are then
+		smoothed together by separable gaussian passes and combined into
+		det(M) - k*trace(M)**2, everything is processed in float32 and a
+		strip of rows at a time
+	:inputs:
+		src [np.ndarray]
+			'--> grayscale (or BGR) image
+		sigma [float]
+			'--> standard deviation of the gaussian window
+		k [float]
+			'--> harris sensitivity parameter
+		numberCorners [int, None]
+			'--> when given, the (at most) numberCorners strongest local
+				 maxima (3x3 non maximal suppression) of the response are
+				 returned instead of the response
+		workspace [ipcv.Workspace]
+			'--> optional owner of the intermediate buffers, repeated
+				 calls on frames of the same shape then allocate no new
+				 full-frame arrays
+	:return:
+		response [np.ndarray] (float32, rows x cols)
+		or
+		corners [np.ndarray] (N x 2 rows and cols, strongest first),
+		responses [np.ndarray] (N)
+	"""
+
+	#ERROR CHECKING
+	ipcv.type_check(src,(np.ndarray,),"src")
+	ipcv.value_check(sigma,(0,":"),'b',"sigma")
+	if numberCorners is not None:
+		ipcv.value_check(numberCorners,(0,":"),'b',"numberCorners")
+	if workspace is None:
+		workspace = ipcv.Workspace()
+	ipcv.type_check(workspace,(ipcv.Workspace,),"workspace")
+
+	try:
+		img = src
+		if img.ndim == 3:
+			img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+		rows, cols = img.shape
+		taps = _gaussian_taps(sigma)
+		radius = taps.size // 2
+		pad = radius + 1
+
+		padded = ipcv.copy_make_border(img, pad, pad, pad, pad, ipcv.BORDER_REFLECT_101,
+		                               dst=workspace.buffer("harris.padded", (rows + 2*pad, cols + 2*pad), np.float32))
+
+		#the whole pipeline runs strip by strip so that it stays in cache
+		response = np.empty( (rows, cols), dtype=np.float32 )
+		for top in range(0, rows, _STRIP_ROWS):
+			_strip_response(padded, top, min(top + _STRIP_ROWS, rows), taps, k, response, workspace)
+
+		if numberCorners is None:
+			return response
+
+		cornerRows, cornerCols = np.nonzero( _suppress(response) )
+		strengths = response[cornerRows, cornerCols]
+		order = np.argsort(-strengths, kind='stable')[:numberCorners]
+		return np.stack( (cornerRows[order], cornerCols[order]), axis=1 ), strengths[order]
+
+	except Exception as e:
+		ipcv.debug(e)
 
 
 if __name__ == '__main__':
 
-    import os.path
-    import time
+	import os.path
+	import time
+	import numpy
 
-    home = os.path.expanduser('~')
-    filename = home + os.path.sep + 'src/python/examples/data/checkerboard.tif'
-    filename = home + os.path.sep + 'src/python/examples/data/sparse_checkerboard.tif'
+	home = os.path.expanduser('~')
+	filename = home + os.path.sep + 'src/python/examples/data/checkerboard.tif'
+	filename = home + os.path.sep + 'src/python/examples/data/sparse_checkerboard.tif'
 
-    src = cv2.imread(filename, cv2.IMREAD_UNCHANGED)
+	src = cv2.imread(filename, cv2.IMREAD_UNCHANGED)
 
-    sigma = 1
-    k = 0.04
-    startTime = time.time()
-    dst = ipcv.harris(src, sigma, k)
-    print('Elapsed time = {0} [s]'.format(time.time() - startTime))
+	sigma = 1
+	k = 0.04
+	startTime = time.time()
+	dst = ipcv.harris(src, sigma, k)
+	print('Elapsed time = {0} [s]'.format(time.time() - startTime))
 
-    cv2.namedWindow(filename, cv2.WINDOW_AUTOSIZE)
-    cv2.imshow(filename, src)
+	cv2.namedWindow(filename, cv2.WINDOW_AUTOSIZE)
+	cv2.imshow(filename, src)
 
-    if len(src.shape) == 2:
-    annotatedImage = cv2.merge((src, src, src))
-    else:
-    annotatedImage = src
-    fractionMaxResponse = 0.25
-    annotatedImage[dst > fractionMaxResponse*dst.max()] = [0,0,255]
+	if len(src.shape) == 2:
+		annotatedImage = cv2.merge((src, src, src))
+	else:
+		annotatedImage = src
+	fractionMaxResponse = 0.25
+	annotatedImage[dst > fractionMaxResponse*dst.max()] = [0,0,255]
 
-    cv2.namedWindow(filename + ' (Harris Corners)', cv2.WINDOW_AUTOSIZE)
-    cv2.imshow(filename + ' (Harris Corners)', annotatedImage)
+	cv2.namedWindow(filename + ' (Harris Corners)', cv2.WINDOW_AUTOSIZE)
+	cv2.imshow(filename + ' (Harris Corners)', annotatedImage)
 
-    print('Corner coordinates ...')
-    indices = numpy.where(dst > fractionMaxResponse*dst.max())
-    numberCorners = len(indices[0])
-    if numberCorners > 0:
-    for corner in range(numberCorners):
-    print('({0},{1})'.format(indices[0][corner], indices[1][corner]))
+	print('Corner coordinates ...')
+	indices = numpy.where(dst > fractionMaxResponse*dst.max())
+	numberCorners = len(indices[0])
+	if numberCorners > 0:
+		for corner in range(numberCorners):
+			print('({0},{1})'.format(indices[0][corner], indices[1][corner]))
 
-    action = ipcv.flush()
\ No newline at end of file
+	action = ipcv.flush()
@@ -1,11 +1,42 @@
-from sys import exc_info
-from os.path import split
-import cv2
 import numpy as np
-import matplotlib.pyplot as plt
+import ipcv
 
+HISTOGRAM_RETURN_TYPES = (0, 1)
 
-def histogram(img,channels=0,histSize=256,mask=None,ranges=[0,256],returnType=1):
+# pixels binned per pass, bounds the memory held by the bin indices
+_STRIP_PIXELS = 1 << 20
+
+
+def _bin_index(values, histSize, ranges):
+	"""
+	histogram bin of every value, histSize (the discarded bin) for the
+	values outside of [ranges[0], ranges[1])
+	"""
+	low, high = ranges
+	integer = np.issubdtype(values.dtype, np.integer)
+	if integer and high - low == histSize and int(low) == low:
+		#one bin per digital count
+		index = values.astype(np.intp)
+		if low != 0:
+			index -= int(low)
+	elif integer and int(low) == low and int(high) == high:
+		index = (values.astype(np.int64) - int(low)) * histSize // (int(high) - int(low))
+		index = index.astype(np.intp)
+	else:
+		scale = histSize / (high - low)
+		index = np.floor( (values.astype(np.float64) - low) * scale ).astype(np.intp)
+		np.minimum(index, histSize - 1, out=index)
+
+	if integer and np.iinfo(values.dtype).min >= low and np.iinfo(values.dtype).max < high:
+		return index
+	outside = (values < low) | (values >= high)
+	if not integer:
+		outside |= np.isnan(values)
+	index[outside] = histSize
+	return index
+
+
+def histogram(img,channels=0,histSize=256,mask=None,ranges=[0,256],returnType=1,batch=False):
 	"""
 	:NAME:
 		histogram
@@ -13,27 +44,37 @@ def histogram(img,channels=0,histSize=256,mask=None,ranges=[0,256],returnType=1)
 	:PURPOSE:
 		This method returns an image histogram, pdf and cdf. working for both color and grayscale imagery
 
+		every requested band (and every image of a batch) is binned in a single np.bincount
+		pass over the image, the bin of integer pixels is their digital count (or integer
+		bin arithmetic for coarser bins), floating point pixels are binned by their offset
+		from ranges[0], pixels outside of 'ranges' are not counted
+
+		the pdf is normalized by the number of (unmasked) pixels of each band
+
 
 	:CATEGORY:
 		ipcv -- histogram generation tool
 
 	:CALLING SEQUENCE:
-		quantizedImage = histogram(img,\
+		hist,pdf,cdf = histogram(img,\
 									channels=channels,\
 									histSize=histSize,\
 									mask=mask,\
-									ranges=ranges)
+									ranges=ranges,\
+									batch=batch)
 
 
 	:INPUTS:
 		img
-			[numpy.ndarray]	input image
+			[numpy.ndarray]	input image (rows,cols) or (rows,cols,bands), or a batch of
+			images (number,rows,cols[,bands]) when 'batch' is True
 		channels
-			[list] list of channels to compute
+			[int, list, None] band to compute, a list of bands, or None for all of the bands
 		histSize
-			[int] maximum number of histogram bins
+			[int] number of histogram bins
 		mask
-			[numpy.ndarray] section of image to compute
+			[numpy.ndarray] section of image to compute (non zero pixels), (rows,cols) or
+			(number,rows,cols) for a batch
 		ranges
 			[list] range of values that are computed in the histogram
 		returnType
@@ -42,11 +83,14 @@ def histogram(img,channels=0,histSize=256,mask=None,ranges=[0,256],returnType=1)
 					# return all arrays in one numpy.ndarray #
 				elif returnType == 1
 					# return all values sequentially #
-					return 
-					
+		batch
+			[bool] whether the first axis of 'img' indexes a batch of images
+
 
 	:RETURN VALUE:
-		a numpy array containing 
+		histogram, pdf and cdf, each (histSize) for a single channel, (channels,histSize)
+		for a list of channels (or None), with a leading (number) axis for a batch,
+		returnType 0 stacks them along a last axis of 3
 
 	:ERROR CHECKING:
 		ValueError
@@ -54,9 +98,7 @@ def histogram(img,channels=0,histSize=256,mask=None,ranges=[0,256],returnType=1)
 
 	:REQUIRES:
 		np
-		cv2
-		sys.exc_info
-		matplotlib.pyplot
+		ipcv
 
 	:MODIFICATION HISTORY:
 		Engineer:	Jeff Maggio
@@ -64,56 +106,88 @@ def histogram(img,channels=0,histSize=256,mask=None,ranges=[0,256],returnType=1)
 
 	"""
 
+	#ERROR CHECKING
+	ipcv.type_check(img,(np.ndarray,),"img")
+	ipcv.type_check(channels,(int,np.integer,list,tuple,type(None)),"channels")
+	ipcv.type_check(histSize,(int,np.integer,list,tuple),"histSize")
+	ipcv.type_check(mask,(np.ndarray,type(None)),"mask")
+	ipcv.value_check(returnType,HISTOGRAM_RETURN_TYPES,'d',"returnType")
+	if isinstance(histSize,(list,tuple)):
+		ipcv.value_check(len(histSize),1,'e',"len(histSize)")
+		histSize = histSize[0]
+	histSize = int(histSize)
+	ipcv.value_check(histSize,(1,":"),'b',"histSize")
+	ipcv.value_check(ranges[1] > ranges[0],True,'e',"ranges[1] > ranges[0]")
+
+	images = img if batch else img[np.newaxis]
+	ipcv.value_check(images.ndim,(3,4),'d',"img.ndim")
+	if images.ndim == 3:
+		images = images[:,:,:,np.newaxis]
+	number, rows, cols, bands = images.shape
+
+	single = isinstance(channels,(int,np.integer))
+	if channels is None:
+		channels = list(range(bands))
+	elif single:
+		channels = [channels]
+	channels = [int(c) for c in channels]
+	for c in channels:
+		ipcv.value_check(c,(0,bands-1),'b',"channels")
+
+	if mask is not None:
+		ipcv.value_check(mask.shape,((rows,cols),(number,rows,cols)),'d',"mask.shape")
+		mask = mask != 0
+		if mask.ndim == 3:
+			mask = mask.reshape(number*rows, cols)
+
+	try:
+		numberChannels = len(channels)
+		if channels != list(range(bands)):
+			images = images[:,:,:,channels]
+		#the batch is binned as one tall image, every (image, band) pair has
+		#its own histSize + 1 bins, the last of which collects the pixels
+		#outside of 'ranges'
+		stacked = images.reshape(number*rows, cols, numberChannels)
+		binsPerImage = numberChannels * (histSize + 1)
+		bandOffset = np.arange(numberChannels) * (histSize + 1)
+		counts = np.zeros(number * binsPerImage, dtype=np.int64)
+		totals = np.zeros(number, dtype=np.int64)
+
+		stripRows = max(1, _STRIP_PIXELS // (cols * numberChannels))
+		for top in range(0, number*rows, stripRows):
+			bottom = min(top + stripRows, number*rows)
+			index = _bin_index(stacked[top:bottom], histSize, ranges)
+			index += bandOffset
+			imageRow = np.arange(top, bottom) // rows
+			if number > 1:
+				index += (imageRow * binsPerImage)[:,np.newaxis,np.newaxis]
+			if mask is None:
+				totals += np.bincount(imageRow, minlength=number) * cols
+			else:
+				selected = mask[top:bottom] if mask.shape[0] == number*rows else mask[np.arange(top, bottom) % rows]
+				index = index[selected]
+				totals += np.bincount(imageRow, weights=selected.sum(axis=1), minlength=number).astype(np.int64)
+			counts += np.bincount(index.ravel(), minlength=counts.size)
+
+		hist = counts.reshape(number, numberChannels, histSize + 1)[:,:,:histSize].astype(np.float64)
+		pdf = hist / np.maximum(totals, 1)[:,np.newaxis,np.newaxis]
+		cdf = np.cumsum(pdf, axis=-1)
+
+		hist, pdf, cdf = [ a[:,0] if single else a for a in (hist, pdf, cdf) ]
+		if not batch:
+			hist, pdf, cdf = hist[0], pdf[0], cdf[0]
 
-
-	try: 
-
-		histogram = cv2.calcHist([img],channels=[channels],mask=mask,histSize=[histSize],ranges=ranges)
-		pdf = histogram / img.size
-		cdf = np.cumsum(pdf)
 		if returnType == 0: # return all arrays in one numpy.ndarray
-			cdf = np.reshape(cdf,histogram.shape)
-			hpc = np.hstack((histogram,pdf,cdf))
-			return hpc
+			return np.stack( (hist,pdf,cdf), axis=-1 )
 		elif returnType == 1: # return all arrays sequentially
-			histogram = histogram.flatten()
-			pdf = pdf.flatten()
-			return histogram,pdf,cdf
-
-
-			
+			return hist,pdf,cdf
 
 	except Exception as e:
-		print("-------------------------------------------------------------------")
-		exc_type, exc_obj, exc_tb = exc_info()
-		fname = split(exc_tb.tb_frame.f_code.co_filename)[1]
-		print("unable to compute because: {0} on line {1} in file {2}".format(e,exc_tb.tb_lineno,fname))
-		print("-------------------------------------------------------------------")
-
-		#Error checking img
-		if isinstance(img, np.ndarray) == False:
-			print("input 'img' must be a numpy.ndarray | currently is {0}".format(type(img)))
-		elif (img.dtype != np.uint8) and (img.dtype != np.float32):
-			print("input 'img' must either be np.uint8 or np.float32")
-			print("currently is {0}".format(img.dtype))
-		#Error checking channels
-		if isinstance(channels, int) == False:
-			print("input 'channels' must be a integer")
-			print("currently is {0}".format(type(channels)))
-		#error checking Mask
-		if isinstance(mask, np.ndarray) == False and isinstance(mask, type(None)) == False:
-			print("input 'mask' must be a numpy.ndarray or NoneType")
-			print("currently is {0}".format(type(mask)))
-		#Error checking histSize
-		if isinstance(histSize, list) == False:
-			print("input 'histSize' must be a python list of 1 value")
-			print("currently is {0}".format(type(histSize)))
-		elif len(histSize) != 1:
-			print("input 'histSize' must be a python list of 1 value")
-			print("currently is {0}".format(len(histSize)))
+		ipcv.debug(e)
 
 
 if __name__ == "__main__":
+	import cv2
 	import os.path
 	import matplotlib.pyplot as plt
 
@@ -121,10 +195,10 @@ if __name__ == "__main__":
 	filename = home + os.path.sep + 'src/python/examples/data/redhat.ppm'
 
 	img = cv2.imread(filename)
-	hpc = histogram(img,channels=[0],histSize=[256],mask=None,ranges=[0,256])
+	hpc = histogram(img,channels=0,histSize=256,mask=None,ranges=[0,256],returnType=0)
 	print(hpc)
 	print(hpc.shape)
 	legendList = ['histogram','pdf','cdf']
 	for i in [1,2]:
-		plt.plot(hpc[:,i], label = legendList)
+		plt.plot(hpc[:,i], label = legendList[i])
 	plt.show()
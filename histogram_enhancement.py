@@ -2,8 +2,171 @@ import ipcv
 from sys import exc_info
 from os.path import split
 import numpy as np
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
 
-def histogram_enhancement(img, etype='linear2', target=None, maxCount=255, pool = False):
+# pixels per tile when the work is spread over a pool of threads
+_TILE_PIXELS = 1 << 20
+
+def _executor(pool):
+	"""
+	executor for 'pool' (None to work on the calling thread) and whether
+	it belongs to the call (and must be shut down by it)
+	"""
+	if isinstance(pool, Executor):
+		return pool, False
+	if pool is True:
+		pool = os.cpu_count() or 1
+	if not pool or pool == 1:
+		return None, False
+	return ThreadPoolExecutor(max_workers=int(pool)), True
+
+
+def _map(executor, function, tasks):
+	"""
+	results of function(task) in the order of the tasks
+	"""
+	if executor is None:
+		return [ function(task) for task in tasks ]
+	return list( executor.map(function, tasks) )
+
+
+def _row_tiles(img, executor):
+	"""
+	row slices splitting the image into tiles of about _TILE_PIXELS pixels
+	(the whole image without an executor), the tiling does not depend on
+	the number of workers so neither do the results
+	"""
+	rows = img.shape[0]
+	if executor is None:
+		return [ slice(0, rows) ]
+	step = max(1, _TILE_PIXELS // max(1, img[0].size))
+	return [ slice(top, min(top + step, rows)) for top in range(0, rows, step) ]
+
+
+def _window_bounds(length, tiles, window):
+	"""
+	[start, stop) of the contextual windows centered on every tile, both
+	are non decreasing so the windows only ever slide forward
+	"""
+	centers = (np.arange(tiles) + 0.5) * (length / tiles)
+	start = np.clip(np.round(centers - window / 2), 0, length).astype(int)
+	stop = np.clip(np.round(centers + window / 2), 0, length).astype(int)
+	return start, stop
+
+
+def _window_histograms(band, tileGridSize, windowSize, levels):
+	"""
+	histograms (tilesY, tilesX, levels) of the windows centered on every
+	tile
+
+	the columns are split into blocks at every window edge and one
+	histogram per block is kept for the rows of the current window, when
+	the window moves down the entering rows are added to the block
+	histograms and the leaving rows subtracted, along a row of tiles the
+	window histogram adds its entering blocks and subtracts its leaving
+	ones, so every pixel is counted at most twice whatever the window size
+	"""
+	rows, cols = band.shape
+	tilesY, tilesX = tileGridSize
+	yStart, yStop = _window_bounds(rows, tilesY, windowSize[0])
+	xStart, xStop = _window_bounds(cols, tilesX, windowSize[1])
+
+	edges = np.unique( np.concatenate( ([0, cols], xStart, xStop) ) )
+	numberBlocks = edges.size - 1
+	blockOffset = (np.searchsorted(edges, np.arange(cols), side='right') - 1) * levels
+	firstBlock = np.searchsorted(edges, xStart)
+	lastBlock = np.searchsorted(edges, xStop)
+
+	def block_counts(top, bottom):
+		index = np.add(band[top:bottom], blockOffset, dtype=np.intp)
+		return np.bincount(index.ravel(), minlength=numberBlocks*levels).reshape(numberBlocks, levels)
+
+	hist = np.empty( (tilesY, tilesX, levels), dtype=np.int64 )
+	blocks = np.zeros( (numberBlocks, levels), dtype=np.int64 )
+	top = bottom = 0
+	for i in range(tilesY):
+		if yStart[i] >= bottom:
+			#no overlap with the previous window
+			blocks[...] = 0
+		elif yStart[i] > top:
+			blocks -= block_counts(top, yStart[i])
+		if yStop[i] > max(bottom, yStart[i]):
+			blocks += block_counts(max(bottom, yStart[i]), yStop[i])
+		top, bottom = yStart[i], yStop[i]
+
+		window = blocks[firstBlock[0]:lastBlock[0]].sum(axis=0)
+		hist[i,0] = window
+		for j in range(1, tilesX):
+			window += blocks[lastBlock[j-1]:lastBlock[j]].sum(axis=0)
+			window -= blocks[firstBlock[j-1]:firstBlock[j]].sum(axis=0)
+			hist[i,j] = window
+
+	area = np.outer(yStop - yStart, xStop - xStart)
+	return hist, area
+
+
+def _clipped_luts(hist, area, clipLimit, maxCount):
+	"""
+	equalization lookup tables (tilesY, tilesX, levels) of the window
+	histograms, the counts above the clip limit are spread evenly over
+	all the levels (the remainder over every (levels//remainder)th one)
+	"""
+	levels = hist.shape[-1]
+	if clipLimit > 0:
+		clip = np.maximum( (clipLimit * area / levels).astype(np.int64), 1 )[:,:,np.newaxis]
+		excess = np.maximum(hist - clip, 0).sum(axis=-1, keepdims=True)
+		hist = np.minimum(hist, clip) + excess // levels
+		residual = excess % levels
+		step = np.maximum(levels // np.maximum(residual, 1), 1)
+		level = np.arange(levels)
+		hist += (level % step == 0) & (level // step < residual)
+
+	lut = np.cumsum(hist, axis=-1) * (maxCount / np.maximum(area, 1))[:,:,np.newaxis]
+	return np.clip(np.rint(lut), 0, maxCount).astype(np.float32)
+
+
+def _tile_weights(length, tiles):
+	"""
+	for every pixel along an axis, the two neighbouring tiles and the
+	weight of the second one
+	"""
+	position = np.arange(length) * (tiles / length) - 0.5
+	first = np.floor(position)
+	weight = (position - first).astype(np.float32)
+	first = first.astype(int)
+	return np.clip(first, 0, tiles - 1), np.clip(first + 1, 0, tiles - 1), weight
+
+
+def _blend_luts(band, luts, dst):
+	"""
+	maps every pixel through the luts of the four nearest tiles and blends
+	them bilinearly, a strip of rows at a time
+	"""
+	rows, cols = band.shape
+	tilesY, tilesX, levels = luts.shape
+	table = luts.ravel()
+	y1, y2, ya = _tile_weights(rows, tilesY)
+	x1, x2, xa = _tile_weights(cols, tilesX)
+	left = x1 * levels
+	right = x2 * levels
+
+	stripRows = max(1, (1 << 16) // cols)
+	for top in range(0, rows, stripRows):
+		bottom = min(top + stripRows, rows)
+		values = band[top:bottom].astype(np.intp)
+		rowWeight = ya[top:bottom,np.newaxis]
+		blended = None
+		for tileRow, weight in ((y1, 1 - rowWeight), (y2, rowWeight)):
+			base = values + (tileRow[top:bottom] * tilesX * levels)[:,np.newaxis]
+			row = table.take(base + left) * (1 - xa)
+			row += table.take(base + right) * xa
+			row *= weight
+			blended = row if blended is None else blended + row
+		dst[top:bottom] = np.rint(blended)
+
+
+def histogram_enhancement(img, etype='linear2', target=None, maxCount=255, pool = False, out=None, workspace=None, tileGridSize=(8,8), clipLimit=2.0, windowSize=None):
 	"""
 	:NAME:
 		histogram_enchancement
@@ -15,7 +178,12 @@ def histogram_enhancement(img, etype='linear2', target=None, maxCount=255, pool
 			equalization -- a technique to even out peaks on the histogram and product a near-flat
 				histogram curve
 			match -- modifies an image such that it's pixel distribution mimics that of a target 
-				image or distribution
+				image or distribution (the lookup table is one np.searchsorted per band, the target
+				cdfs are cached for as long as the 'target' array is alive)
+			clahe -- contrast limited adaptive equalization, every tile of a tileGridSize grid is
+				equalized with the clipped histogram of a window centered on it and the pixels
+				blend the lookup tables of their four nearest tiles, the window histograms are
+				updated incrementally as the window slides (O(pixels) for any window size)
 
 
 
@@ -27,7 +195,9 @@ def histogram_enhancement(img, etype='linear2', target=None, maxCount=255, pool
 											etype=etype,\
 											target=targer,\
 											maxCount = maxCount,\
-											pool = pool)
+											pool = pool,\
+											out = out,\
+											workspace = workspace)
 
 
 	:INPUTS:
@@ -40,11 +210,29 @@ def histogram_enhancement(img, etype='linear2', target=None, maxCount=255, pool
 		maxCount
 			[int] the largest possible DC value in the image
 		pool
-			[boolean] whether or not to pool all colors into one cdf or loop by band 
+			[int, concurrent.futures.Executor] number of threads (True for one per cpu), or
+			an executor, over which the histograms and the lookup tables of row tiles (or the
+			bands for 'clahe') are spread, numpy releases the GIL in these kernels, the
+			counts of the tiles are summed in a fixed order so the result does not depend
+			on the number of workers
+		out
+			[numpy.ndarray] optional array with the shape of 'img' that receives
+			the enhanced image (the input image is never modified)
+		workspace
+			[ipcv.Workspace] optional owner of the lookup table buffer
+		tileGridSize
+			[tuple] (rows, cols) number of tiles for 'clahe'
+		clipLimit
+			[float] 'clahe' contrast limit, relative to the mean count of a level in a
+			window (0 disables the clipping)
+		windowSize
+			[tuple] (rows, cols) of the 'clahe' windows, the tile size when None
 					
 
 	:RETURN VALUE:
-		a numpy array containing the enhanced image
+		a numpy array containing the enhanced image ('out' if provided,
+		otherwise a new array in the dtype of 'img', or the smallest unsigned
+		dtype holding maxCount when that of 'img' cannot)
 
 	:SIDE EFFECTS:
 		removes possibly pertinent data in an image
@@ -84,94 +272,71 @@ def histogram_enhancement(img, etype='linear2', target=None, maxCount=255, pool
 		print("-------------------------------------------------------------------")
 
 	if isinstance(img, np.ndarray) == True:
-	    img = img.reshape(img.shape[0],img.shape[1],1) if ( len(img.shape) == 2 ) else img
-	    bands = img.shape[2]
-	
-	if isinstance(target, np.ndarray) == True:
-	    target = target.reshape(target.shape[0],target.shape[1],1) if ( len(target.shape) == 2 ) else target
-	
+		if out is None:
+			holds = np.issubdtype(img.dtype, np.integer) and np.iinfo(img.dtype).max >= maxCount
+			out = np.empty(img.shape, dtype=img.dtype if holds else np.min_scalar_type(maxCount))
+		elif (isinstance(out, np.ndarray) == False) or (out.shape != img.shape):
+			print("-------------------------------------------------------------------")
+			print("input 'out' must be a numpy.ndarray with the shape of 'img' {0}".format(img.shape))
+			print("-------------------------------------------------------------------")
+			print("raising TypeError...")
+			raise TypeError
+		img = img.reshape(img.shape[0],img.shape[1],1) if ( len(img.shape) == 2 ) else img
+		dst = out[:,:,np.newaxis] if ( len(out.shape) == 2 ) else out
+		bands = img.shape[2]
+
 	if etype == "match":
-		if ( len(target.shape) != 1 ) and ( target.shape[2] != img.shape[2] ):
+		targetBands = 1 if ( len(target.shape) < 3 ) else target.shape[2]
+		if ( len(target.shape) != 1 ) and ( targetBands != img.shape[2] ):
 			print("-------------------------------------------------------------------")
 			print("original and target images must both be of the same type (grayscale or color")
 			print("raising TypeError...")
 			print("-------------------------------------------------------------------")
 			raise TypeError
 
-		
-	#BEGIN ACTUAL WORK
-	try:
-	     #2 is index of cdf from return tuple
-
-	    if "linear" in etype:
-
-	    	for band in range(bands):
-
-	    		#cdf is recalculated by band
-	    		cdf = ipcv.histogram(img=img,channels=band,histSize=(maxCount+1),\
-		    		ranges=[0,maxCount+1],returnType=1)[2]
-
-		    	# generating components of the line
-		    	lowerBound = (float(etype.replace("linear","") ) / 200.0) #1/2 input on each side
-		    	upperbound = ( 1 - lowerBound )
-		    	dcLow = np.where(cdf >= lowerBound)[0][0]
-		    	dcHigh = np.where(cdf <= upperbound)[0][-1]
-		    	m = ( maxCount / (dcHigh - dcLow) )
-		    	b = maxCount - ( m * dcHigh )
-
-		    	#generating the lookup table by applying a linear transform
-		    	LUT = ( m * np.arange(maxCount+1) ) + b
-		    	LUT = np.clip(LUT,0,255)
-		    	print(img[:,:,band].shape)
-		    	img[:,:,band] = LUT[img[:,:,band]]
-
+	if etype == "clahe":
+		#the block histograms have no bin for the counts outside of [0, maxCount]
+		ipcv.value_check(img.size == 0 or (img.min() >= 0 and img.max() <= maxCount),True,'e',"'img' within [0, maxCount]")
 
+	if workspace is None:
+		workspace = ipcv.Workspace()
+	#one lookup table per band, in the output dtype
+	luts = workspace.buffer("histogram_enhancement.lut", (bands,maxCount+1), dst.dtype)
 
-	    elif etype == 'equalize':
 
-	    	for band in range(bands):
-	    		cdf = ipcv.histogram(img=img,channels=band,histSize=(maxCount+1),\
-		    		ranges=[0,maxCount+1],returnType=1)[2]
-
-		    	LUT = (cdf * maxCount).flatten()
-		    	print(LUT.shape)
-		    	img[:,:,band] = LUT[img[:,:,band]]
-
-
-
-	    elif etype == "match":
-	    	#Generating the target CDFs
-    		tCdf = []
-	    	if len(target.shape) == 1:
-	    		for band in range(bands):
-		    		tCdf.append( np.cumsum(target) )
-	    	else:
-	    		for band in range(bands):
-		    		tCdf.append(ipcv.histogram(img=target,channels=band,histSize=(maxCount+1),\
-			    		ranges=[0,maxCount+1],returnType=1)[2]) #only return the cdf here
-
-
-
-	    	for band in range(bands):
-	    		cdf = ipcv.histogram(img=img,channels=band,histSize=(maxCount+1),\
-		    		ranges=[0,maxCount+1],returnType=1)[2]
-
-		    	LUT = np.zeros(maxCount+1)
-		    	index = 0
-		    	for percentage in cdf:
-		    		upperValues = np.where(tCdf[band]>=percentage)
-		    		if upperValues[0].size != 0:
-		    			dc = upperValues[0][0]
-		    		else:
-		    			dc = 0
-		    		LUT[index] = dc
-		    		index += 1
-
-		    	img[:,:,band] = LUT[img[:,:,band]]
-
-
-
-	    return img.astype(np.uint8)
+	#BEGIN ACTUAL WORK
+	try:
+		executor, owned = _executor(pool)
+		try:
+			if etype != "clahe":
+				#the counts of every band are computed in one pass over every tile
+				tiles = _row_tiles(img, executor)
+				counts = _map(executor, lambda tile: ipcv.histogram(img=img[tile],channels=None,\
+					histSize=(maxCount+1),ranges=[0,maxCount+1],returnType=1)[0], tiles)
+				hist = counts[0]
+				for count in counts[1:]:
+					hist = hist + count
+				cdfs = np.cumsum(hist / (img.shape[0] * img.shape[1]), axis=-1)
+
+				ipcv.enhancement_luts(etype, cdfs, target, maxCount, luts)
+				_map(executor, lambda tile: ipcv.apply_lut(img[tile], luts, out=dst[tile]), tiles)
+
+			else:
+				rows, cols = img.shape[:2]
+				if windowSize is None:
+					windowSize = (rows / tileGridSize[0], cols / tileGridSize[1])
+
+				def clahe(band):
+					hist, area = _window_histograms(img[:,:,band], tileGridSize, windowSize, maxCount+1)
+					tileLuts = _clipped_luts(hist, area, clipLimit, maxCount)
+					_blend_luts(img[:,:,band], tileLuts, dst[:,:,band])
+				_map(executor, clahe, range(bands))
+
+		finally:
+			if owned:
+				executor.shutdown()
+
+		return out
 
 	except Exception as e:
 		print("===================================================================")
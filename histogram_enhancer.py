@@ -0,0 +1,142 @@
+import threading
+import numpy as np
+import ipcv
+
+# global modes that a single set of lookup tables can apply to a stream
+HISTOGRAM_ENHANCER_TYPES = ("equalize", "match")
+
+
+class HistogramEnhancer(object):
+	"""
+	:purpose:
+		global histogram enhancement ('linearN', 'equalize' or 'match', as
+		in ipcv.histogram_enhancement) of a stream of frames
+
+		the enhancer keeps a running pdf per band that decays
+		exponentially, pdf = decay*pdf + (1-decay)*framePdf, so the
+		lookup tables follow the scene without flickering from frame to
+		frame, the tables are only rebuilt when the running cdf has moved
+		by more than 'tolerance' (largest absolute difference) from the
+		cdf they were built from, every other frame is a single
+		ipcv.apply_lut, the frame pdf itself is measured on every
+		'sampleStride'-th row and column only
+	:inputs:
+		etype [str]
+			'--> 'linearN' (N percent stretch), 'equalize' or 'match'
+		target [np.ndarray]
+			'--> target image or distribution of 'match'
+		maxCount [int]
+			'--> the largest possible digital count of the frames
+		decay [float]
+			'--> weight [0, 1) of the running pdf against the new frame
+				 (0 only uses the current frame)
+		tolerance [float]
+			'--> cdf drift that triggers a rebuild of the tables (0
+				 rebuilds them on every frame)
+		sampleStride [int]
+			'--> row and column step of the pixels that update the pdf
+	"""
+
+	def __init__(self, etype='linear2', target=None, maxCount=255, decay=0.9, tolerance=0.01, sampleStride=2):
+		ipcv.value_check(etype.startswith("linear") or etype in HISTOGRAM_ENHANCER_TYPES,True,'e',"supported 'etype'")
+		if etype == "match":
+			ipcv.type_check(target,(np.ndarray,),"target")
+		ipcv.type_check(maxCount,(int,),"maxCount")
+		ipcv.value_check(maxCount,(1,":"),'b',"maxCount")
+		ipcv.value_check(decay,(0,1),'b',"decay")
+		ipcv.value_check(decay < 1,True,'e',"decay < 1")
+		ipcv.value_check(tolerance,(0,":"),'b',"tolerance")
+		ipcv.value_check(sampleStride,(1,":"),'b',"sampleStride")
+
+		self._etype = etype
+		self._target = target
+		self._maxCount = maxCount
+		self._decay = decay
+		self._tolerance = tolerance
+		self._sampleStride = int(sampleStride)
+		self._lock = threading.Lock()
+		self.reset()
+
+	def reset(self):
+		"""
+		forgets the running statistics and the tables
+		"""
+		self._pdf = None
+		self._builtCdf = None
+		self._luts = None
+		self._frames = 0
+		self._rebuilds = 0
+
+	@property
+	def pdf(self):
+		"""
+		running (bands, maxCount+1) pdf, None before the first frame
+		"""
+		return self._pdf
+
+	@property
+	def rebuilds(self):
+		"""
+		number of times the lookup tables have been built
+		"""
+		return self._rebuilds
+
+	@property
+	def frames(self):
+		return self._frames
+
+	def apply(self, img, out=None):
+		"""
+		:purpose:
+			updates the running statistics with 'img' and returns the
+			enhanced frame
+		:inputs:
+			img [np.ndarray]
+				'--> integer frame (rows,cols) or (rows,cols,bands)
+			out [np.ndarray]
+				'--> optional array with the shape of 'img' that receives
+					 the enhanced frame
+		:return:
+			enhanced frame [np.ndarray] ('out' if provided, otherwise a
+			new array in the dtype of 'img', or the smallest unsigned
+			dtype holding maxCount when that of 'img' cannot)
+		"""
+		ipcv.type_check(img,(np.ndarray,),"img")
+		if out is None:
+			holds = np.issubdtype(img.dtype, np.integer) and np.iinfo(img.dtype).max >= self._maxCount
+			out = np.empty(img.shape, dtype=img.dtype if holds else np.min_scalar_type(self._maxCount))
+		ipcv.type_check(out,(np.ndarray,),"out")
+		ipcv.value_check(out.shape,(img.shape,),'d',"out.shape")
+		bands = ipcv.dimensions(img)["bands"]
+		if self._pdf is not None:
+			ipcv.value_check(bands,self._pdf.shape[0],'e',"number of bands")
+
+		try:
+			step = self._sampleStride
+			framePdf = ipcv.histogram(img=img[::step,::step],channels=None,histSize=(self._maxCount+1),\
+				ranges=[0,self._maxCount+1],returnType=1)[1]
+
+			with self._lock:
+				if self._pdf is None:
+					self._pdf = framePdf
+				else:
+					self._pdf *= self._decay
+					self._pdf += (1 - self._decay) * framePdf
+				self._frames += 1
+
+				cdfs = np.cumsum(self._pdf, axis=-1)
+				if self._luts is None or self._luts.dtype != out.dtype or \
+				   np.abs(cdfs - self._builtCdf).max() > self._tolerance:
+					luts = np.empty( (bands, self._maxCount+1), dtype=out.dtype )
+					self._luts = ipcv.enhancement_luts(self._etype, cdfs, self._target, self._maxCount, luts)
+					self._builtCdf = cdfs
+					self._rebuilds += 1
+				luts = self._luts
+
+			img = img[:,:,np.newaxis] if img.ndim == 2 else img
+			dst = out[:,:,np.newaxis] if out.ndim == 2 else out
+			ipcv.apply_lut(img, luts, out=dst)
+			return out
+
+		except Exception as e:
+			ipcv.debug(e)
@@ -1 +1,178 @@
+import numpy as np
+import ipcv
 
+
+def _normalization(a, b):
+	"""
+	center and scale that map the coordinates 'a' and 'b' onto about
+	[-1, 1], keeping the polynomial fit well conditioned
+	"""
+	values = np.concatenate( (np.ravel(a), np.ravel(b)) )
+	center = (values.max() + values.min()) / 2
+	scale = max( (values.max() - values.min()) / 2, 1.0 )
+	return center, scale
+
+
+def map_gcp(src, map, srcX, srcY, mapX, mapY, order=1, tileRows=None, out=None):
+	"""
+	:purpose:
+		generates the remap maps (map1, map2) that register 'src' onto
+		'map' with an order N polynomial fitted to ground control points
+
+		x = sum a[i,j] u**i v**j and y = sum b[i,j] u**i v**j (i+j <= order)
+		take every (u,v) pixel of the map onto src, both polynomials are
+		fitted in one least squares solve over normalized coordinates
+
+		the powers of u and v are precomputed once as column and row
+		planes, every row of the grid is then the sum of (order+1)
+		broadcasted products, evaluated 'tileRows' rows at a time
+	:inputs:
+		src [np.ndarray]
+			'--> image to be registered
+		map [np.ndarray]
+			'--> reference image, the maps have its rows and cols
+		srcX, srcY [list, np.ndarray]
+			'--> control point coordinates in src
+		mapX, mapY [list, np.ndarray]
+			'--> the same control points in map
+		order [int]
+			'--> polynomial order, at least (order+1)(order+2)/2 control
+				 points are required
+		tileRows [int, None]
+			'--> number of rows evaluated at a time (bounds the scratch
+				 memory), the whole grid at once when None
+		out [tuple, None]
+			'--> optional pair of float32 (rows,cols) arrays (e.g. writable
+				 numpy.memmap) that receive map1 and map2
+	:return:
+		map1, map2 [np.ndarray] (float32 x and y src coordinates of every
+		map pixel)
+	"""
+
+	#ERROR CHECKING
+	ipcv.type_check(src,(np.ndarray,),"src")
+	ipcv.type_check(map,(np.ndarray,),"map")
+	ipcv.type_check(order,(int,np.integer),"order")
+	ipcv.value_check(order,(1,":"),'b',"order")
+	order = int(order)
+	srcX, srcY, mapX, mapY = [ np.asarray(c, dtype=ipcv.IPCV_64F).ravel() for c in (srcX, srcY, mapX, mapY) ]
+	ipcv.value_check(len(set( (srcX.size, srcY.size, mapX.size, mapY.size) )),1,'e',"number of control point coordinates")
+	terms = [ (i, j) for j in range(order + 1) for i in range(order + 1 - j) ]
+	if srcX.size < len(terms):
+		print("-----------------------------------------------------------")
+		print("                       VALUE ERROR                       \n")
+		print("an order {0} polynomial requires at least {1} control points".format(order,len(terms)))
+		print("\n-----------------------------------------------------------")
+		raise ValueError
+
+	dims = ipcv.dimensions(map)
+	rows, cols = dims["rows"], dims["cols"]
+	if out is None:
+		out = ( np.empty( (rows,cols), dtype=ipcv.IPCV_32F ),
+		        np.empty( (rows,cols), dtype=ipcv.IPCV_32F ) )
+	ipcv.type_check(out,(tuple,list),"out")
+	ipcv.value_check(len(out),2,'e',"len(out)")
+	map1, map2 = out
+	for m in out:
+		ipcv.type_check(m,(np.ndarray,),"out")
+		ipcv.value_check(m.shape,((rows,cols),),'d',"out.shape")
+		ipcv.value_check(m.dtype,(np.dtype(ipcv.IPCV_32F),),'d',"out.dtype")
+	if tileRows is None:
+		tileRows = rows
+	ipcv.type_check(tileRows,(int,np.integer),"tileRows")
+	ipcv.value_check(tileRows,(1,":"),'b',"tileRows")
+	tileRows = int(tileRows)
+
+	try:
+		#fitting x and y together on normalized map coordinates
+		center, scale = _normalization(mapX, mapY)
+		u = (mapX - center) / scale
+		v = (mapY - center) / scale
+		A = np.stack( [ u**i * v**j for i, j in terms ], axis=1 )
+		coefficients = np.linalg.lstsq(A, np.stack( (srcX, srcY), axis=1 ), rcond=None)[0]
+
+		#monomial planes, the powers of u (per column) and of v (per row)
+		uPowers = ( (np.arange(cols) - center) / scale ) ** np.arange(order + 1)[:,np.newaxis]
+		vPowers = ( (np.arange(rows) - center) / scale ) ** np.arange(order + 1)[:,np.newaxis]
+
+		#per power of v, the polynomial in u evaluated along a row
+		rowPolynomials = np.zeros( (2, order + 1, cols) )
+		for (i, j), c in zip(terms, coefficients):
+			rowPolynomials[:,j] += c[:,np.newaxis] * uPowers[i]
+		rowPolynomials = rowPolynomials.astype(ipcv.IPCV_32F)
+		vPowers = vPowers.astype(ipcv.IPCV_32F)
+
+		scratch = np.empty( (min(tileRows, rows), cols), dtype=ipcv.IPCV_32F )
+		for top in range(0, rows, tileRows):
+			bottom = min(top + tileRows, rows)
+			product = scratch[:bottom - top]
+			for m, polynomials in zip( (map1, map2), rowPolynomials ):
+				tile = m[top:bottom]
+				tile[...] = polynomials[0]
+				for j in range(1, order + 1):
+					np.multiply(vPowers[j,top:bottom,np.newaxis], polynomials[j], out=product)
+					tile += product
+
+		return map1, map2
+
+	except Exception as e:
+		ipcv.debug(e)
+
+
+# PYTHON TEST HARNESS
+if __name__ == '__main__':
+
+	import cv2
+	import ipcv
+	import os.path
+	import time
+
+	home = os.path.expanduser('~')
+	srcFilename = home + os.path.sep + \
+	           'src/python/examples/data/registration/image.tif'
+	mapFilename = home + os.path.sep + \
+	           'src/python/examples/data/registration/map.tif'
+	gcpFilename = home + os.path.sep + \
+	           'src/python/examples/data/registration/gcp.dat'
+	src = cv2.imread(srcFilename)
+	map = cv2.imread(mapFilename)
+
+	srcX = []
+	srcY = []
+	mapX = []
+	mapY = []
+	linesRead = 0
+	f = open(gcpFilename, 'r')
+	for line in f:
+		linesRead += 1
+		if linesRead > 2:
+			data = line.rstrip().split()
+			srcX.append(float(data[0]))
+			srcY.append(float(data[1]))
+			mapX.append(float(data[2]))
+			mapY.append(float(data[3]))
+	f.close()
+
+	startTime = time.time()
+	map1, map2 = ipcv.map_gcp(src, map, srcX, srcY, mapX, mapY, order=2)
+	elapsedTime = time.time() - startTime
+	print('Elapsed time (map creation) = {0} [s]'.format(elapsedTime))
+
+	startTime = time.time()
+	dst = ipcv.remap(src, map1, map2, ipcv.INTER_NEAREST)
+	elapsedTime = time.time() - startTime
+	print('Elapsed time (remap) = {0} [s]'.format(elapsedTime))
+
+	srcName = 'Source (' + srcFilename + ')'
+	cv2.namedWindow(srcName, cv2.WINDOW_AUTOSIZE)
+	cv2.imshow(srcName, src)
+
+	mapName = 'Map (' + mapFilename + ')'
+	cv2.namedWindow(mapName, cv2.WINDOW_AUTOSIZE)
+	cv2.imshow(mapName, map)
+
+	dstName = 'Warped (' + mapFilename + ')'
+	cv2.namedWindow(dstName, cv2.WINDOW_AUTOSIZE)
+	cv2.imshow(dstName, dst)
+
+	ipcv.flush()
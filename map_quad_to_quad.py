@@ -1,31 +1,94 @@
 import numpy as np
-from constants import *
 import ipcv
 
 
+def _homographies(x, y, u, v):
+	"""
+	(batch,3,3) homographies taking the (u,v) corners onto the (x,y)
+	corners, all of the 8x8 systems are solved in one stacked call
+	"""
+	batch = x.shape[0]
+	A = np.zeros( (batch,8,8) )
+	A[:,:4,0] = u
+	A[:,:4,1] = v
+	A[:,:4,2] = 1
+	A[:,:4,6] = -u * x
+	A[:,:4,7] = -v * x
+	A[:,4:,3] = u
+	A[:,4:,4] = v
+	A[:,4:,5] = 1
+	A[:,4:,6] = -u * y
+	A[:,4:,7] = -v * y
+	b = np.concatenate( (x, y), axis=1 )[:,:,np.newaxis]
+
+	h = np.linalg.solve(A, b)[:,:,0]
+	return np.concatenate( (h, np.ones((batch,1))), axis=1 ).reshape( (batch,3,3) )
+
+
+def _projective_maps(H, rows, cols):
+	"""
+	float32 (map1, map2) of shape (batch,rows,cols) for the homographies
+	'H' evaluated over a (rows,cols) grid by broadcasting
+	"""
+	u = np.arange(cols, dtype=ipcv.IPCV_32F)[np.newaxis,np.newaxis,:]
+	v = np.arange(rows, dtype=ipcv.IPCV_32F)[np.newaxis,:,np.newaxis]
+	coefficients = H.astype(ipcv.IPCV_32F)[:,:,:,np.newaxis,np.newaxis]
+
+	def plane(row, out):
+		a, b, c = coefficients[:,row,0], coefficients[:,row,1], coefficients[:,row,2]
+		return np.add(a * u, b * v + c, out=out)
+
+	shape = (H.shape[0], rows, cols)
+	map1 = plane(0, np.empty(shape, dtype=ipcv.IPCV_32F))
+	map2 = plane(1, np.empty(shape, dtype=ipcv.IPCV_32F))
+	w = plane(2, np.empty(shape, dtype=ipcv.IPCV_32F))
+	map1 /= w
+	map2 /= w
+	return map1, map2
+
+
 def map_quad_to_quad(img, map, imgX, imgY, mapX, mapY):
-	u1=mapX[0]; u2=mapX[1]; u3=mapX[2]; u4=mapX[3]
-	v1=mapY[0]; v2=mapY[1]; v3=mapY[2]; v4=mapY[3]
-	x1=imgX[0]; x2=imgX[1]; x3=imgX[2]; x4=imgX[3]
-	y1=imgY[0]; y2=imgY[1]; y3=imgY[3]; y4=imgY[3]
+	"""
+	:purpose:
+		generates the remap maps (map1, map2) that warp the quadrilateral
+		(imgX, imgY) of 'img' onto the quadrilateral (mapX, mapY) of 'map'
+
+		the homography taking the target corners onto the image corners is
+		solved with np.linalg.solve and evaluated over the whole target
+		grid by broadcasting, several quads can be given at once (one per
+		row of the corner arrays) and are solved in one stacked call
+	:inputs:
+		img [np.ndarray]
+			'--> image to be warped
+		map [np.ndarray]
+			'--> target image, the maps have its rows and cols
+		imgX, imgY [list, np.ndarray]
+			'--> the 4 corners of the source quad, or a (batch,4) array
+		mapX, mapY [list, np.ndarray]
+			'--> the 4 corners of the target quad, or a (batch,4) array
+				 (a single quad on one side is paired with every quad of
+				 a batch on the other)
+	:return:
+		map1, map2 [np.ndarray] (float32 x and y image coordinates of
+		every target pixel, (rows,cols) or (batch,rows,cols))
+	"""
+
+	#ERROR CHECKING
+	ipcv.type_check(img,(np.ndarray,),"img")
+	ipcv.type_check(map,(np.ndarray,),"map")
 
 	try:
-		bigMat = np.linalg.inv(np.asmatrix([[  u1,    u2,    u3,    u4,     0,     0,     0,     0  ],
-							  				[  v1,    v2,    v3,    v4,     0,     0,     0,     0  ],
-										    [   1,     1,     1,     1,     0,     0,     0,     0  ],
-										    [  	0,     0,     0,     0,    u1,    u2,    u3,    u4  ],
-										    [  	0,     0,     0,     0,    v1,    v2,    v3,    v4  ],
-										    [   0,     0,     0,     0,     1,     1,     1,     1  ],
-											[-x1*u1,-u2*x2,-u3*x3,-u4*x4,-u1*y1,-u2*y2,-u3*y3,-u4*y4],
-											[-x1*v1,-v2*x2,-v3*x3,-v4*x4,-v1*y1,-v2*y2,-v3*y3,-v4*y4] ]))
-		cordinatesVector = np.asmatrix((np.hstack((mapX,mapY))))
-		shifted = cordinatesVector * bigMat
-		shifted = np.hstack((shifted,np.ones((1,1))))
-		# shifted = np.transpose(np.hstack((shifted,[1])))
-		shifted = np.reshape(shifted,(3,3))
-		maps = shifted * np.transpose(np.asmatrix([ mapX, mapY, 1] ))
-		maps = maps / maps[2]
-		return maps[0],maps[1]
+		corners = [ np.asarray(c, dtype=ipcv.IPCV_64F) for c in (imgX, imgY, mapX, mapY) ]
+		batched = any(c.ndim == 2 for c in corners)
+		#a single quad on either side is shared by every quad of the batch
+		x, y, u, v = [ c.reshape( (-1,4) ) for c in np.broadcast_arrays(*corners) ]
+
+		H = _homographies(x, y, u, v)
+		dims = ipcv.dimensions(map)
+		map1, map2 = _projective_maps(H, dims["rows"], dims["cols"])
+		if not batched:
+			return map1[0], map2[0]
+		return map1, map2
 
 	except Exception as e:
 		ipcv.debug(e)
@@ -38,7 +101,7 @@ if __name__ == '__main__':
 	import ipcv
 	import os.path
 	import time
-
+	import numpy
 
 	home = os.path.expanduser('~')
 	imgFilename = home + os.path.sep + 'src/python/examples/data/lenna.tif'
@@ -74,14 +137,14 @@ if __name__ == '__main__':
 	print('   v -> {0}'.format(mapY))
 	print('')
 
-	startTime = time.clock()
+	startTime = time.time()
 	map1, map2 = ipcv.map_quad_to_quad(img, map, imgX, imgY, mapX, mapY)
-	elapsedTime = time.clock() - startTime
+	elapsedTime = time.time() - startTime
 	print('Elapsed time (map creation) = {0} [s]'.format(elapsedTime)) 
 
-	startTime = time.clock()
+	startTime = time.time()
 	dst = cv2.remap(img, map1, map2, cv2.INTER_NEAREST)
-	elapsedTime = time.clock() - startTime
+	elapsedTime = time.time() - startTime
 	print('Elapsed time (remap) = {0} [s]'.format(elapsedTime)) 
 	print('')
 
@@ -1,61 +1,88 @@
 import numpy as np
-import cv2
 import ipcv
-from constants import *
-import time
+
+
+def _affine_maps(inverse, rows, cols):
+	"""
+	float32 (map1, map2) of a (rows, cols) destination for the 2x3 affine
+	'inverse' that maps destination pixels onto source pixels, each map is
+	one broadcasted sum of a row vector and a column vector
+	"""
+	x = np.arange(cols, dtype=ipcv.IPCV_32F)[np.newaxis,:]
+	y = np.arange(rows, dtype=ipcv.IPCV_32F)[:,np.newaxis]
+	maps = []
+	for a, b, c in inverse:
+		m = np.empty( (rows, cols), dtype=ipcv.IPCV_32F )
+		np.add( (a * x).astype(ipcv.IPCV_32F), (b * y + c).astype(ipcv.IPCV_32F), out=m )
+		maps.append(m)
+	return maps[0], maps[1]
+
 
 # PYTHON METHOD DEFINITION
-def map_rotation_scale(src, rotation=0, scale=[1, 1]):
+def map_rotation_scale(src, rotation=0, scale=[1, 1], matrix=None, dstSize=None):
+	"""
+	:purpose:
+		generates the remap maps (map1, map2) that scale an image by
+		'scale' and then rotate it by 'rotation' degrees (counter
+		clockwise) about its center, the destination is the size of the
+		scaled image
+
+		any other affine transform (shear, translation, ...) is given as a
+		2x3 'matrix', every transform is inverted and evaluated over the
+		destination grid in one broadcasted pass
+	:inputs:
+		src [np.ndarray]
+			'--> source image
+		rotation [float]
+			'--> counter clockwise rotation in degrees
+		scale [list]
+			'--> [horizontal, vertical] scale factors
+		matrix [np.ndarray, None]
+			'--> 2x3 affine matrix mapping source (x, y) pixel coordinates
+				 onto destination coordinates (as for cv2.warpAffine),
+				 replaces 'rotation' and 'scale'
+		dstSize [tuple, None]
+			'--> (cols, rows) of the destination, the scaled source size
+				 (the source size when 'matrix' is given) by default
+	:return:
+		map1, map2 [np.ndarray] (float32 x and y source coordinates of
+		every destination pixel)
+	"""
+
+	#ERROR CHECKING
+	ipcv.type_check(src,(np.ndarray,),"src")
+	if matrix is not None:
+		matrix = np.asarray(matrix, dtype=ipcv.IPCV_64F)
+		ipcv.value_check(matrix.shape,((2,3),),'d',"matrix.shape")
+
 	try:
-		theta = np.radians(rotation)
 		srcDims = ipcv.dimensions(src, returnType="dictionary")
-
 		K = srcDims['cols']
 		L = srcDims['rows']
 
-		W = scale[0]
-		H = scale[1]
-		M = K * W
-		N = L * H
-
-
-		x = K
-		y = H
-
-		dimVector = np.asmatrix( [x,
-								  y,
-								  1] )
-
-		# SCALING
-		scaleMat = np.asarray( [ [W,0,0],
-								 [0,H,0],
-								 [0,0,1] ] ) 
-		dimVector = dimVector * scaleMat
-
-
-
-		scaledDims = np.asmatrix( [ np.arange(dimVector[0,0]),
-									np.arange(dimVector[0,1]),
-								  			  1				] )
-
-
-		dimVector[0,0] = dimVector[0,0] - M/2
-		dimVector[0,1] = N/2 - dimVector[0,1]
-
-		# ROTATION
-		sinTheta = np.sin(theta)
-		cosTheta = np.cos(theta)
-		rotationMat = np.asmatrix( [ [cosTheta,  -sinTheta,  0.0],
-									 [sinTheta, cosTheta,  0.0],
-									 [     0.,       0.,    1.0] ] )
-		dimVector = dimVector * rotationMat
-
-
-		#Realigning Image about corner
-		dimVector[0,0] = dimVector[0,0] + K/2
-		dimVector[0,1] = L/2 - dimVector[0,1]
-
-		return dimVector[0,0].astype(IPCV_32F),dimVector[0,1].astype(IPCV_32F)
+		if matrix is None:
+			W = scale[0]
+			H = scale[1]
+			M = int(round(K * W))
+			N = int(round(L * H))
+
+			#scaling then rotating about the center (rows point down, so the
+			#counter clockwise rotation flips the sign of the sines)
+			theta = np.radians(rotation)
+			sinTheta = np.sin(theta)
+			cosTheta = np.cos(theta)
+			linear = np.asarray( [ [ cosTheta, sinTheta],
+			                       [-sinTheta, cosTheta] ] ) * [W, H]
+			offset = np.asarray( [M/2, N/2] ) - linear.dot( [K/2, L/2] )
+			matrix = np.hstack( (linear, offset[:,np.newaxis]) )
+			if dstSize is None:
+				dstSize = (M, N)
+		elif dstSize is None:
+			dstSize = (K, L)
+
+		#destination -> source
+		inverse = np.linalg.inv( np.vstack( (matrix, [0, 0, 1]) ) )[:2]
+		return _affine_maps(inverse, dstSize[1], dstSize[0])
 
 	except Exception as e:
 		ipcv.debug(e)
@@ -75,16 +102,16 @@ if __name__ == '__main__':
 	filename = home + os.path.sep + 'src/python/examples/data/lenna.tif'
 	src = cv2.imread(filename)
 
-	startTime = time.clock()
+	startTime = time.time()
 	map1, map2 = ipcv.map_rotation_scale(src, rotation=30, scale=[1.0, 0.8])
-	elapsedTime = time.clock() - startTime
+	elapsedTime = time.time() - startTime
 	print('Elapsed time (map creation) = {0} [s]'.format(elapsedTime))
 
-	startTime = time.clock()
+	startTime = time.time()
 	dst = cv2.remap(src, map1, map2, cv2.INTER_NEAREST)
 	# print(dst)
 	#   dst = ipcv.remap(src, map1, map2, ipcv.INTER_NEAREST)
-	elapsedTime = time.clock() - startTime
+	elapsedTime = time.time() - startTime
 	# print('Elapsed time (remapping) = {0} [s]'.format(elapsedTime)) 
 
 	srcName = 'Source (' + filename + ')'
@@ -96,66 +123,3 @@ if __name__ == '__main__':
 	cv2.imshow(dstName, dst)
 
 	ipcv.flush()
-
-
-# # PYTHON METHOD DEFINITION
-# def map_gcp(src, map, srcX, srcY, mapX, mapY, order=1):
-
-# # PYTHON TEST HARNESS
-# if __name__ == '__main__':
-
-# 	import cv2
-# 	import ipcv
-# 	import os.path
-# 	import time
-
-# 	home = os.path.expanduser('~')
-# 	imgFilename = home + os.path.sep + \
-# 	           'src/python/examples/data/registration/image.tif'
-# 	mapFilename = home + os.path.sep + \
-# 	           'src/python/examples/data/registration/map.tif'
-# 	gcpFilename = home + os.path.sep + \
-# 	           'src/python/examples/data/registration/gcp.dat'
-# 	src = cv2.imread(srcFilename)
-# 	map = cv2.imread(mapFilename)
-
-# 	srcX = []
-# 	srcY = []
-# 	mapX = []
-# 	mapY = []
-# 	linesRead = 0
-# 	f = open(gcpFilename, 'r')
-# 	for line in f:
-# 	linesRead += 1
-# 	if linesRead > 2:
-# 	   data = line.rstrip().split()
-# 	   srcX.append(float(data[0]))
-# 	   srcY.append(float(data[1]))
-# 	   mapX.append(float(data[2]))
-# 	   mapY.append(float(data[3]))
-# 	f.close()
-
-# 	startTime = time.clock()
-# 	map1, map2 = ipcv.map_gcp(src, map, srcX, srcY, mapX, mapY, order=2)
-# 	elapsedTime = time.clock() - startTime
-# 	print('Elapsed time (map creation) = {0} [s]'.format(elapsedTime)) 
-
-# 	startTime = time.clock()
-# 	dst = cv2.remap(src, map1, map2, cv2.INTER_NEAREST)
-# 	#   dst = ipcv.remap(src, map1, map2, ipcv.INTER_NEAREST)
-# 	elapsedTime = time.clock() - startTime
-# 	print('Elapsed time (remap) = {0} [s]'.format(elapsedTime)) 
-
-# 	srcName = 'Source (' + srcFilename + ')'
-# 	cv2.namedWindow(srcName, cv2.WINDOW_AUTOSIZE)
-# 	cv2.imshow(srcName, src)
-
-# 	mapName = 'Map (' + mapFilename + ')'
-# 	cv2.namedWindow(mapName, cv2.WINDOW_AUTOSIZE)
-# 	cv2.imshow(mapName, map)
-
-# 	dstName = 'Warped (' + mapFilename + ')'
-# 	cv2.namedWindow(dstName, cv2.WINDOW_AUTOSIZE)
-# 	cv2.imshow(dstName, dst)
-
-# 	ipcv.flush()
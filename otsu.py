@@ -3,7 +3,73 @@ from sys import exc_info
 from os.path import split
 import ipcv
 
-def otsu_threshold(img, maxCount=255, verbose=False):
+# largest number of levels for multi-level thresholds, whose search holds
+# (levels x levels) tables
+OTSU_MAX_MULTILEVEL_COUNTS = 4096
+
+
+def _otsu_single(pdf):
+	"""
+	otsu threshold of every pdf in the (number, levels) array 'pdf', the
+	between class variance of every candidate threshold is evaluated in
+	one array expression
+	"""
+	levels = pdf.shape[-1]
+	omega = np.cumsum(pdf, axis=-1)
+	mu = np.cumsum( np.arange(levels) * pdf, axis=-1 )
+	muTotal = mu[:,-1:]
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		sigmaSquaredB = ( (muTotal * omega) - mu )**2 / ( omega * (1-omega) )
+
+	#candidates run from the first populated level up to (excluding) the
+	#last level whose cdf is below one
+	k = np.arange(levels)
+	startingK = np.argmax(omega > 0.0, axis=-1)[:,np.newaxis]
+	endingK = (levels - 1 - np.argmax(omega[:,::-1] < 1.0, axis=-1))[:,np.newaxis]
+	valid = (k >= startingK) & (k < endingK) & np.isfinite(sigmaSquaredB)
+	return np.argmax( np.where(valid, sigmaSquaredB, 0), axis=-1 )
+
+
+def _otsu_multilevel(pdf, numberThresholds):
+	"""
+	the 'numberThresholds' thresholds that maximize the between class
+	variance of the 1-D 'pdf'
+
+	with the prefix sums P (probability) and S (first moment), a class of
+	levels [a, b] contributes (S[b]-S[a-1])**2 / (P[b]-P[a-1]), the best
+	split of [0, b] into j classes is then built from the best splits into
+	j-1 classes, one (levels x levels) array expression per class
+	"""
+	levels = pdf.size
+	P = np.concatenate( ([0.0], np.cumsum(pdf)) )
+	S = np.concatenate( ([0.0], np.cumsum(np.arange(levels) * pdf)) )
+
+	#term[a, b] for the class [a, b] (a <= b)
+	weight = P[np.newaxis,1:] - P[:-1,np.newaxis]
+	moment = S[np.newaxis,1:] - S[:-1,np.newaxis]
+	with np.errstate(divide='ignore', invalid='ignore'):
+		term = np.where(weight > 0, moment**2 / weight, 0.0)
+	term[np.tril_indices(levels, -1)] = -np.inf
+
+	best = term[0]
+	choices = []
+	for j in range(numberThresholds):
+		#class j+1 starts at a (threshold a-1), the previous classes cover [0, a-1]
+		candidates = best[:-1,np.newaxis] + term[1:]
+		choice = np.argmax(candidates, axis=0)
+		best = candidates[choice, np.arange(levels)]
+		choices.append(choice)
+
+	thresholds = []
+	b = levels - 1
+	for choice in reversed(choices):
+		b = choice[b]
+		thresholds.append(b)
+	return np.array(thresholds[::-1])
+
+
+def otsu_threshold(img, maxCount=255, verbose=False, numberThresholds=1, batch=False):
 	"""
 	:NAME:
 		otsu_threshold
@@ -12,6 +78,10 @@ def otsu_threshold(img, maxCount=255, verbose=False):
 		this method generates a binary thresholded image based off of 
 		Otsu's class discrimination method
 
+		the between class variance of every candidate threshold is evaluated at once, 
+		multi-level thresholds (2-4) are found from prefix sum tables of the histogram
+		in O(levels**2), and a batch of images is thresholded from a single histogram pass
+
 	:CATEGORY:
 		ipcv -- object recognition and thresholding tool
 
@@ -22,16 +92,25 @@ def otsu_threshold(img, maxCount=255, verbose=False):
 
 	:INPUTS:
 		img
-			[numpy.ndarray]	input image to be quanitized
+			[numpy.ndarray]	input image to be quanitized, or a (number,rows,cols) batch of
+			images when 'batch' is True
 		maxCount
 			[int] maximum pixel value in the output array
 		verbose
 			[boolean] whether or not to graph the histogram 
+		numberThresholds
+			[int] number of thresholds (1-4), the image is split into numberThresholds+1
+			classes
+		batch
+			[boolean] whether the first axis of 'img' indexes a batch of images
 
 	:RETURN VALUE:
 		tuple containing:
 			returnTuple[0] -- binary numpy.array of the same shape as the input image
-			returnTuple[1] -- threshold determined by otsu's method
+				(class labels 0..numberThresholds for multi-level thresholds)
+			returnTuple[1] -- threshold determined by otsu's method (an array of
+				numberThresholds thresholds for multi-level thresholds, with a leading
+				(number) axis for a batch)
 
 
 	:ERROR CHECKING:
@@ -52,15 +131,12 @@ def otsu_threshold(img, maxCount=255, verbose=False):
 	"""
 ######################  BEGIN ERROR CHECKING  #######################
 	if isinstance(img,np.ndarray) == True:
-		dims = ipcv.dimensions(img,"dictionary")
-
-		if dims["bands"] == 1:
-
-			if len(img.shape) == 3:
-				#making the array two dimensional if it only has 1 band 
-				img = img.reshape(dims['rows'],dims['cols'])
+		images = img if batch else img[np.newaxis]
+		if images.ndim == 4 and images.shape[3] == 1:
+			#making the arrays two dimensional if they only have 1 band 
+			images = images[:,:,:,0]
 
-		else:
+		if images.ndim != 3:
 			print("")
 			print("input 'img' must be grayscale or single-banded")
 			print("")
@@ -89,47 +165,57 @@ def otsu_threshold(img, maxCount=255, verbose=False):
 		print("")
 		raise TypeError
 
+	if isinstance(numberThresholds,int) == False:
+		print("")
+		print("input 'numberThresholds' must be an int, currently {0}".format(type(numberThresholds)))
+		print("")
+		raise TypeError
+	elif numberThresholds < 1 or numberThresholds > 4:
+		print("")
+		print("input 'numberThresholds' must be between 1 and 4")
+		print("")
+		raise ValueError
+	elif numberThresholds > 1 and maxCount >= OTSU_MAX_MULTILEVEL_COUNTS:
+		print("")
+		print("multi-level thresholds require 'maxCount' below {0}".format(OTSU_MAX_MULTILEVEL_COUNTS))
+		print("")
+		raise ValueError
+
 
 ######################  END ERROR CHECKING  #######################
 
 	try:
 
 		numberCounts = maxCount + 1
-		#generating the pdf and cdf
-		hist,pdf,cdf = ipcv.histogram(img,histSize=numberCounts,ranges=[0,numberCounts])
-		
-		meanLevelArray = np.cumsum( np.arange(0,numberCounts) * pdf )
-		muTotal = meanLevelArray[-1]
+		#generating the pdfs of every image in one pass
+		hist,pdf,cdf = ipcv.histogram(images,histSize=numberCounts,ranges=[0,numberCounts],batch=True)
 
-		sigmaSquaredBValues = np.zeros(numberCounts)
-		startingK = np.where(cdf>0.0)[0][0]
-		endingK = np.where(cdf<1.0)[0][-1]
-
-		for k in range(startingK, endingK):
-			muK = meanLevelArray[k]
-			omegaK = cdf[k]
-			sigmaSquaredB = ( ( (muTotal * omegaK) - muK )**2 ) / ( omegaK * (1-omegaK) )
-			sigmaSquaredBValues[k] = sigmaSquaredB
-
-		threshold = np.argmax(sigmaSquaredBValues)
+		if numberThresholds == 1:
+			thresholds = _otsu_single(pdf)[:,np.newaxis]
+		else:
+			thresholds = np.stack( [ _otsu_multilevel(p, numberThresholds) for p in pdf ] )
 
-		LUT = np.zeros( numberCounts )
-		LUT[threshold+1:] = 1
+		#class of every digital count in every image (the number of
+		#thresholds below it)
+		LUT = ( np.arange(numberCounts)[np.newaxis,np.newaxis] > thresholds[:,:,np.newaxis] ).sum(axis=1)
+		labels = ipcv.apply_lut(images, LUT.astype(np.uint8), axis=0)
 
-		img = LUT[img]
+		threshold = thresholds[:,0] if numberThresholds == 1 else thresholds
 
-		if verbose == True:
-			values = (pdf,)
+		if verbose == True and batch == False:
+			values = (pdf[0],)
 			colors = ('r',)
 			filename = "image_pdf_wOtsu.eps"
-			thresholdMarker = (threshold,)
-			labels = ("pdf",)
-			graph = ipcv.quickplot(values,colors,labels,filename=filename,verticalMarkers=thresholdMarker,\
+			thresholdMarker = tuple(thresholds[0])
+			labelNames = ("pdf",)
+			graph = ipcv.quickplot(values,colors,labelNames,filename=filename,verticalMarkers=thresholdMarker,\
 				xLabel="Digital Counts",yLabel="probability",display=False)
-			graph.annotate("otsu's Threshold", xy=(threshold, .01), xytext=(3, 1.5),arrowprops=dict(facecolor='black', shrink=0.05))
+			graph.annotate("otsu's Threshold", xy=(thresholds[0][0], .01), xytext=(3, 1.5),arrowprops=dict(facecolor='black', shrink=0.05))
 			graph.show()
 
-		return img.astype(np.uint8), threshold
+		if batch == False:
+			return labels[0], threshold[0]
+		return labels, threshold
 
 
 	except Exception as e:
@@ -1,10 +1,76 @@
 #PYTHON3
 import cv2
 import numpy as np
+import ipcv
+from functools import lru_cache
 from sys import exc_info
 
+# integer types quantized through a lookup table indexed by the pixel values
+QUANTIZE_LUT_DTYPES = (np.uint8, np.uint16)
 
-def quantize(img, levels, qtype="uniform", maxCount=255, displayLevels=None):
+
+def _igs_reference(img, divisor, maxCount):
+	"""
+	reference (pixel by pixel) improved gray scale quantization, the error
+	term carries over every pixel in flat order, 'img' is not modified
+	"""
+	img = img.copy()
+	error = 0
+	for pixel in range(img.size): #for each column in the row
+		pixelValue = img.flat[pixel]
+		bigPix = pixelValue + error
+
+		if (bigPix) < maxCount:
+			img.flat[pixel] = ( bigPix // divisor ) 
+
+		else:
+			img.flat[pixel] = ( pixelValue // divisor )
+
+		error = (bigPix) % divisor
+	return img
+
+
+def _igs(img, levels, displayLevels, maxCount):
+	"""
+	vectorized improved gray scale quantization
+
+	the error carried into a pixel is (sum of all previous pixels) mod
+	divisor, since (a + b mod d) mod d == (a + b) mod d, so the whole
+	sequential scan is one cumulative sum, values are scaled by 'levels'
+	(divisor = displayLevels / levels) to keep integer images exact
+	"""
+	if np.issubdtype(img.dtype, np.integer):
+		scaled = img.astype(np.int64).ravel() * levels
+		#reducing before the sum keeps it far from overflowing
+		carried = np.cumsum(scaled % displayLevels)
+	else:
+		scaled = img.astype(np.float64).ravel() * levels
+		carried = np.cumsum(scaled)
+	#scaled error carried into every pixel (none into the first one)
+	error = np.empty_like(scaled)
+	error[0] = 0
+	np.remainder(carried[:-1], displayLevels, out=error[1:])
+
+	bigPix = scaled + error
+	bigPix = np.where(bigPix < maxCount * levels, bigPix, scaled)
+	return ( bigPix // displayLevels ).reshape(img.shape)
+
+
+@lru_cache(maxsize=32)
+def _uniform_lut(levels, displayLevels, maxCount, dtype):
+	"""
+	(read only) uniform quantization table for every value of 'dtype'
+	"""
+	dtype = np.dtype(dtype)
+	divisor = int(displayLevels) / levels
+	values = np.arange(np.iinfo(dtype).max + 1)
+	lut = int(divisor) * (values // divisor).astype(np.int64)
+	lut = np.minimum(lut, min(maxCount, np.iinfo(dtype).max)).astype(dtype)
+	lut.setflags(write=False)
+	return lut
+
+
+def quantize(img, levels, qtype="uniform", maxCount=255, displayLevels=None, reference=False):
 	"""
 	:NAME:
 		quantize
@@ -15,8 +81,14 @@ def quantize(img, levels, qtype="uniform", maxCount=255, displayLevels=None):
 		quanitization techniques -- "uniform" and "igs".
 
 		"uniform" quantizes an image by flooring all the values to a defined level.
+			uint8 and uint16 images go through a lookup table, built once per
+			(levels, displayLevels, maxCount, dtype) and cached
 		"igs" floors the values and then adds some calculated error to the image to reduce apparent contouring
 			in addition, this will return an image with the same standard error, 
+			the error carried from pixel to pixel is computed for the whole image at once
+			(a cumulative sum), 'reference' selects the original pixel by pixel loop
+
+		the input image is never modified
 
 	:CATEGORY:
 		ipcv -- histogram analysis tool
@@ -39,10 +111,15 @@ def quantize(img, levels, qtype="uniform", maxCount=255, displayLevels=None):
 			[int] maximum pixel value in the output array
 		displayLevels
 			[int] number of theoretical possible values in input image
-				  (NOT THE NUMBER OF ACTUAL UNIQUE PIXEL VALUES)
+				  (NOT THE NUMBER OF ACTUAL UNIQUE PIXEL VALUES),
+				  maxCount + 1 when None
+		reference
+			[bool] use the (slow) pixel by pixel "igs" loop, for verification
 
 	:RETURN VALUE:
-		result is a quanitized np array of the same shape as the input image
+		result is a quanitized np array of the same shape as the input image,
+		integer images keep their dtype (values are clipped to maxCount),
+		other images are returned as uint8
 
 	:SIDE EFFECTS:
 		can produce very visible contouring!
@@ -67,6 +144,8 @@ def quantize(img, levels, qtype="uniform", maxCount=255, displayLevels=None):
 		if isinstance(img, np.ndarray) == False:
 			print( "input 'img' must be a valid numpy.ndarray" )
 			raise ValueError
+		if displayLevels is None:
+			displayLevels = maxCount + 1
 		if isinstance(displayLevels,int) == False: #checking to see if displayLevels is an integer
 			print( "input 'displayLevels' must be an integer" )
 			raise ValueError
@@ -97,23 +176,27 @@ def quantize(img, levels, qtype="uniform", maxCount=255, displayLevels=None):
 		#BEGIN QUANTIZATION PROCEDURE
 		divisor = int(displayLevels) / levels
 
+		dtype = img.dtype
+
 		if qtype == "uniform":
+			if img.dtype in QUANTIZE_LUT_DTYPES:
+				return ipcv.apply_lut(img, _uniform_lut(levels, displayLevels, maxCount, img.dtype.str))
 			img = (img // divisor)
 		
 		elif qtype == "igs":
-			error = 0
-			for pixel in range(img.size): #for each column in the row
-				pixelValue = img.flat[pixel]
-				bigPix = pixelValue + error
-
-				if (bigPix) < maxCount:
-					img.flat[pixel] = ( bigPix // divisor ) 
-
-				else:
-					img.flat[pixel] = ( pixelValue // divisor )
-
-				error = (bigPix) % divisor
-		img = int(divisor) * img.astype(np.uint8) #converting to a unsigned 8 for display purposes
+			if reference:
+				img = _igs_reference(img, divisor, maxCount)
+			else:
+				img = _igs(img, levels, displayLevels, maxCount)
+
+		if np.issubdtype(dtype, np.integer):
+			#scaling the quantized levels back to digital counts through a table
+			maximum = min(maxCount, np.iinfo(dtype).max)
+			img = img.astype(np.intp)
+			LUT = np.minimum(int(divisor) * np.arange(max(int(img.max(initial=0)), 0) + 1), maximum)
+			img = ipcv.apply_lut(img, LUT.astype(dtype))
+		else:
+			img = int(divisor) * img.astype(np.uint8) #converting to a unsigned 8 for display purposes
 
 	except Exception as exception:
 		print("----------------------------------------------")
@@ -1,13 +1,192 @@
 import numpy as np
+import ipcv
 
-# # PYTHON METHOD DEFINITION
-def remap(src, map1, map2, interpolation=ipcv.INTER_NEAREST, borderMode=ipcv.BORDER_CONSTANT, borderValue=0):
-	dst = np.zeros(src.shape)
-	map1 = np.round(map1)
-	map2 = np.round(map2)
+# interpolations understood by remap
+REMAP_INTERPOLATIONS = (ipcv.INTER_NEAREST, ipcv.INTER_LINEAR, ipcv.INTER_CUBIC)
 
+# Keys cubic convolution parameter (the same as OpenCV)
+_CUBIC_A = -0.75
 
-	
+# destination pixels processed per strip, small enough for the gathered
+# samples and the weights to stay in cache
+_STRIP_PIXELS = 1 << 15
+
+
+def _cubic_weights(t):
+	"""
+	the four Keys cubic convolution weights for a fractional offset 't'
+	"""
+	A = _CUBIC_A
+	s = 1 - t
+	w0 = ((A*(t + 1) - 5*A)*(t + 1) + 8*A)*(t + 1) - 4*A
+	w1 = ((A + 2)*t - (A + 3))*t*t + 1
+	w2 = ((A + 2)*s - (A + 3))*s*s + 1
+	return (w0, w1, w2, 1 - w0 - w1 - w2)
+
+
+def _taps(position, fraction, interpolation, dtype):
+	"""
+	integer offsets and weights of the samples of one axis
+	"""
+	if interpolation == ipcv.INTER_NEAREST:
+		return (0,), (None,)
+	if fraction is None:
+		fraction = np.zeros(position.shape, dtype=dtype)
+	if interpolation == ipcv.INTER_LINEAR:
+		return (0, 1), (1 - fraction, fraction)
+	return (-1, 0, 1, 2), _cubic_weights(fraction)
+
+
+def _strip_coordinates(map1, map2, top, bottom, interpolation, dtype):
+	"""
+	integer source coordinates and their fractions (None when the samples
+	are not interpolated) of the destination rows [top, bottom)
+	"""
+	fixedPoint = map1.ndim == 3 and np.issubdtype(map1.dtype, np.integer)
+	if fixedPoint:
+		#(x,y) integer pairs in map1, fractions (1/ipcv.INTER_TAB_SIZE of
+		#a pixel) packed as y*ipcv.INTER_TAB_SIZE + x in map2
+		x = map1[top:bottom,:,0].astype(np.intp)
+		y = map1[top:bottom,:,1].astype(np.intp)
+		if map2 is None or interpolation == ipcv.INTER_NEAREST:
+			return x, y, None, None
+		table = map2[top:bottom].astype(np.intp) & (ipcv.INTER_TAB_SIZE*ipcv.INTER_TAB_SIZE - 1)
+		fx = (table & (ipcv.INTER_TAB_SIZE - 1)).astype(dtype) / ipcv.INTER_TAB_SIZE
+		fy = (table >> ipcv.INTER_BITS).astype(dtype) / ipcv.INTER_TAB_SIZE
+		return x, y, fx, fy
+
+	if map1.ndim == 3:
+		x = map1[top:bottom,:,0]
+		y = map1[top:bottom,:,1]
+	else:
+		x = map1[top:bottom]
+		y = map2[top:bottom]
+	if interpolation == ipcv.INTER_NEAREST:
+		return np.rint(x).astype(np.intp), np.rint(y).astype(np.intp), None, None
+	xFloor = np.floor(x)
+	yFloor = np.floor(y)
+	fx = (x - xFloor).astype(dtype)
+	fy = (y - yFloor).astype(dtype)
+	return xFloor.astype(np.intp), yFloor.astype(np.intp), fx, fy
+
+
+def remap(src, map1, map2, interpolation=ipcv.INTER_NEAREST, borderMode=ipcv.BORDER_CONSTANT, borderValue=0, dst=None):
+	"""
+	:purpose:
+		applies a generic geometrical transformation to an image (a native
+		equivalent of cv2.remap), dst(x,y) = src(mapx(x,y), mapy(x,y))
+
+		the destination is produced a strip of rows at a time, for every
+		strip the source samples of the interpolation kernel are gathered
+		with their coordinates mapped by ipcv.border_interpolate and
+		weighted (separable linear or Keys cubic weights)
+	:inputs:
+		src [np.ndarray]
+			'--> source image (rows,cols) or (rows,cols,bands)
+		map1 [np.ndarray]
+			'--> float x coordinates (dstRows,dstCols), float (x,y) pairs
+				 (dstRows,dstCols,2), or fixed-point int16 (x,y) pairs as
+				 produced by ipcv.convert_maps or cv2.convertMaps
+		map2 [np.ndarray, None]
+			'--> float y coordinates for a float x map, the uint16 table
+				 of 1/32 pixel fractions for a fixed-point map, or None
+		interpolation [int]
+			'--> ipcv.INTER_NEAREST, ipcv.INTER_LINEAR or ipcv.INTER_CUBIC
+		borderMode [int]
+			'--> one of the ipcv.BORDER_* constants, how samples outside
+				 of the source are extrapolated
+		borderValue [int, float, tuple]
+			'--> value (or per band values) of ipcv.BORDER_CONSTANT
+		dst [np.ndarray]
+			'--> optional output array of the map shape (and the bands
+				 and dtype of 'src')
+	:return:
+		remapped image [np.ndarray] (dtype of 'src')
+	"""
+
+	#ERROR CHECKING
+	ipcv.type_check(src,(np.ndarray,),"src")
+	ipcv.type_check(map1,(np.ndarray,),"map1")
+	ipcv.value_check(interpolation,REMAP_INTERPOLATIONS,'d',"interpolation")
+	ipcv.value_check(borderMode,ipcv.BORDER_TYPES,'d',"borderMode")
+	ipcv.value_check(src.ndim,(2,3),'d',"src.ndim")
+	ipcv.value_check(map1.ndim,(2,3),'d',"map1.ndim")
+	if map1.ndim == 3:
+		ipcv.value_check(map1.shape[2],2,'e',"map1.shape[2]")
+	if map2 is not None:
+		ipcv.type_check(map2,(np.ndarray,),"map2")
+		ipcv.value_check(map2.shape,(map1.shape[:2],),'d',"map2.shape")
+	elif map1.ndim == 2:
+		print("-----------------------------------------------------------")
+		print("                       VALUE ERROR                       \n")
+		print("'map2' is required when 'map1' only holds x coordinates")
+		print("\n-----------------------------------------------------------")
+		raise ValueError
+
+	dstShape = map1.shape[:2] + src.shape[2:]
+	if dst is None:
+		dst = np.empty(dstShape, dtype=src.dtype)
+	ipcv.type_check(dst,(np.ndarray,),"dst")
+	ipcv.value_check(dst.shape,(dstShape,),'d',"dst.shape")
+	ipcv.value_check(dst.flags.c_contiguous,True,'e',"dst.flags.c_contiguous")
+
+	try:
+		rows, cols, bands, _ = ipcv.dimensions(src,'t')
+		dstRows, dstCols = dstShape[:2]
+		#every pixel (all of its bands) is gathered as a single item
+		pixels = np.ascontiguousarray(src).reshape( (rows*cols, bands) )
+		pixels = pixels.view( np.dtype((np.void, src.dtype.itemsize*bands)) ).ravel()
+		output = dst.reshape( (dstRows, dstCols*bands) )
+
+		#accumulating in float32 unless the source needs double precision
+		dtype = ipcv.IPCV_64F if src.dtype == ipcv.IPCV_64F else ipcv.IPCV_32F
+		border = np.broadcast_to( np.asarray(borderValue, dtype=dtype).ravel(), (bands,) )
+		if np.issubdtype(dst.dtype, np.integer):
+			limits = np.iinfo(dst.dtype)
+		else:
+			limits = None
+
+		stripRows = max(1, _STRIP_PIXELS // dstCols)
+		for top in range(0, dstRows, stripRows):
+			bottom = min(top + stripRows, dstRows)
+			x, y, fx, fy = _strip_coordinates(map1, map2, top, bottom, interpolation, dtype)
+			x = x.ravel()
+			y = y.ravel()
+			fx = None if fx is None else fx.ravel()
+			fy = None if fy is None else fy.ravel()
+
+			colOffsets, colWeights = _taps(x, fx, interpolation, dtype)
+			rowOffsets, rowWeights = _taps(y, fy, interpolation, dtype)
+			sampleCols = [ ipcv.border_interpolate(x + offset, cols, borderMode) for offset in colOffsets ]
+
+			acc = None
+			for rowOffset, rowWeight in zip(rowOffsets, rowWeights):
+				sampleRow = ipcv.border_interpolate(y + rowOffset, rows, borderMode)
+				rowStart = np.maximum(sampleRow, 0) * cols
+				for sampleCol, colWeight in zip(sampleCols, colWeights):
+					samples = pixels.take(rowStart + np.maximum(sampleCol, 0))
+					samples = samples.view(src.dtype).reshape( (-1, bands) ).astype(dtype)
+					if borderMode == ipcv.BORDER_CONSTANT:
+						samples[(sampleRow < 0) | (sampleCol < 0)] = border
+					if rowWeight is None:
+						acc = samples
+						continue
+					samples *= (rowWeight * colWeight)[:,np.newaxis]
+					if acc is None:
+						acc = samples
+					else:
+						acc += samples
+
+			acc = acc.reshape( (bottom - top, dstCols*bands) )
+			if limits is not None and interpolation != ipcv.INTER_NEAREST:
+				np.rint(acc, out=acc)
+				np.clip(acc, limits.min, limits.max, out=acc)
+			output[top:bottom] = acc
+
+		return dst
+
+	except Exception as e:
+		ipcv.debug(e)
 
 
 # # PYTHON TEST HARNESS
@@ -25,9 +204,9 @@ if __name__ == '__main__':
 
 	map1, map2 = ipcv.map_rotation_scale(src, rotation=30, scale=[1.3, 0.8])
 
-	startTime = time.clock()
+	startTime = time.time()
 	dst = ipcv.remap(src, map1, map2, interpolation=ipcv.INTER_NEAREST, borderMode=ipcv.BORDER_CONSTANT, borderValue=0)
-	elapsedTime = time.clock() - startTime
+	elapsedTime = time.time() - startTime
 	print('Elapsed time (remap) = {0} [s]'.format(elapsedTime))
 
 	srcName = 'Source (' + filename + ')'
@@ -39,5 +218,3 @@ if __name__ == '__main__':
 	cv2.imshow(dstName, dst)
 
 	ipcv.flush()
-
-
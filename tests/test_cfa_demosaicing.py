@@ -0,0 +1,41 @@
+import os.path
+import numpy as np
+import pytest
+from ipcv.cfa_demosaicing import cfaDemosaic
+
+# output of the original np.roll implementation for the frames below
+BASELINE = os.path.join(os.path.dirname(__file__), "data", "cfa_demosaic_baseline.npz")
+
+SIZES = [ (48,64), (13,17), (9,3), (7,2), (6,1), (2,5) ]
+PATTERNS = ("GBRG", "GRBG", "BGGR", "RGGB")
+
+
+def _raw(size):
+	rng = np.random.default_rng(size[0] * 1000 + size[1])
+	return rng.integers(0, 256, size=size).astype(np.uint8)
+
+
+def _key(size, pattern):
+	return "{0}x{1}_{2}".format(size[0], size[1], pattern)
+
+
+@pytest.fixture(scope="module")
+def baseline():
+	with np.load(BASELINE) as data:
+		return dict(data)
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_float64_matches_the_baseline(baseline, size, pattern):
+	dst = cfaDemosaic(_raw(size), pattern, dtype=np.float64)
+	np.testing.assert_array_equal(dst, baseline[_key(size, pattern)])
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_float32_is_within_a_count_of_the_baseline(baseline, size, pattern):
+	dst = cfaDemosaic(_raw(size), pattern)
+	expected = baseline[_key(size, pattern)]
+	assert dst.dtype == expected.dtype and dst.shape == expected.shape
+	assert np.abs(dst.astype(int) - expected.astype(int)).max() <= 1
@@ -0,0 +1,14 @@
+import numpy as np
+import ipcv
+
+
+def test_ideal_lowpass_passes_the_cutoff_distance():
+	bank = ipcv.FilterBank()
+	shape = (8,8)
+	D = bank.distance(shape)
+	for cutoff in (1, 2, 3):
+		lowpass = bank.lowpass(cutoff).materialize(shape)
+		highpass = bank.highpass(cutoff).materialize(shape)
+		np.testing.assert_array_equal(lowpass, (D <= cutoff).astype(np.float64))
+		assert (lowpass[D == cutoff] == 1).all()
+		np.testing.assert_array_equal(highpass, 1 - lowpass)
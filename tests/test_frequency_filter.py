@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+import ipcv
+
+ODD_SHAPES = [ (60,89), (61,90), (61,89) ]
+
+
+def _image(shape):
+	return np.random.default_rng(shape[0] * 1000 + shape[1]).integers(0, 256, size=shape).astype(np.uint8)
+
+
+@pytest.mark.parametrize("shape", ODD_SHAPES)
+@pytest.mark.parametrize("filterShape", (ipcv.IPCV_IDEAL, ipcv.IPCV_GAUSSIAN, ipcv.IPCV_BUTTERWORTH))
+def test_half_spectrum_matches_the_full_filter(shape, filterShape):
+	img = _image(shape)
+	lowpass = ipcv.default_filter_bank().lowpass(12, order=2, filterShape=filterShape)
+	full = ipcv.frequency_filter(img, lowpass.materialize(shape))
+	half = ipcv.frequency_filter(img, lowpass.materialize(shape, halfSpectrum=True))
+	np.testing.assert_allclose(half, full, atol=1e-9)
+	np.testing.assert_allclose(ipcv.frequency_filter(img, lowpass), full, atol=1e-9)
+
+
+@pytest.mark.parametrize("shape", ODD_SHAPES)
+def test_complex_images_match_real_images(shape):
+	img = _image(shape)
+	lowpass = ipcv.default_filter_bank().lowpass(12, filterShape=ipcv.IPCV_GAUSSIAN)
+	real = ipcv.frequency_filter(img, lowpass)
+	complex = ipcv.frequency_filter(img.astype(np.complex128), lowpass.materialize(shape))
+	np.testing.assert_allclose(complex, real, atol=1e-9)
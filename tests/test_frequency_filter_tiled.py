@@ -0,0 +1,13 @@
+import numpy as np
+import pytest
+import ipcv
+
+
+@pytest.mark.parametrize("shape", [ (201,299), (200,299), (201,300) ])
+def test_tiles_match_the_whole_image_for_odd_sizes(shape):
+	img = np.random.default_rng(shape[1]).integers(0, 256, size=shape).astype(np.uint8)
+	lowpass = ipcv.default_filter_bank().lowpass(20, filterShape=ipcv.IPCV_GAUSSIAN)
+	whole = ipcv.frequency_filter(img, lowpass)
+	for memoryBudget in (256*2**20, 1 << 20):
+		tiled = ipcv.frequency_filter_tiled(img, lowpass, memoryBudget=memoryBudget)
+		np.testing.assert_allclose(tiled, whole, atol=1e-2)
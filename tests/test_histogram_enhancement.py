@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+import ipcv
+
+
+def _frame(seed, shape=(120,160), maxCount=65535):
+	rng = np.random.default_rng(seed)
+	img = rng.normal(maxCount * 0.4, maxCount * 0.1, size=shape)
+	img[0,:8] = maxCount - np.arange(8) * 5
+	return np.clip(img, 0, maxCount).astype(np.uint16)
+
+
+def test_16bit_output_keeps_the_dtype():
+	img = _frame(0)
+	for etype in ("linear2", "equalize"):
+		dst = ipcv.histogram_enhancement(img, etype=etype, maxCount=65535)
+		assert dst.dtype == np.uint16
+		assert dst.max() > 255
+
+
+def test_16bit_match_keeps_the_brightest_levels():
+	img = _frame(1)
+	target = _frame(2)
+	dst = ipcv.histogram_enhancement(img, etype="match", target=target, maxCount=65535)
+	brightest = img == img.max()
+	assert dst[brightest].min() > 0.9 * target.max()
+
+
+def test_enhancer_keeps_16bit_frames():
+	enhancer = ipcv.HistogramEnhancer(etype="equalize", maxCount=65535, sampleStride=1)
+	img = _frame(3)
+	dst = enhancer.apply(img)
+	assert dst.dtype == np.uint16
+	np.testing.assert_array_equal(dst, ipcv.histogram_enhancement(img, etype="equalize", maxCount=65535))
+
+
+def test_clahe_rejects_counts_above_maxCount():
+	img = _frame(4, maxCount=4095)
+	img[5,5] = 4096
+	with pytest.raises(ValueError):
+		ipcv.histogram_enhancement(img, etype="clahe", maxCount=4095)
@@ -0,0 +1,18 @@
+import numpy as np
+import ipcv
+
+
+def test_single_quad_pairs_with_a_batch():
+	img = np.zeros( (40,50), dtype=np.uint8 )
+	quadX, quadY = [0,49,49,0], [0,0,39,39]
+	batchX = np.array( [[0,49,49,0],[5,45,40,2]], dtype=np.float64 )
+	batchY = np.array( [[0,0,39,39],[3,1,35,30]], dtype=np.float64 )
+
+	for args in ( (quadX, quadY, batchX, batchY), (batchX, batchY, quadX, quadY) ):
+		map1, map2 = ipcv.map_quad_to_quad(img, img, *args)
+		assert map1.shape == (2,40,50)
+		for i in range(2):
+			single = [ a if isinstance(a, list) else a[i] for a in args ]
+			expected1, expected2 = ipcv.map_quad_to_quad(img, img, *single)
+			np.testing.assert_allclose(map1[i], expected1, atol=1e-3)
+			np.testing.assert_allclose(map2[i], expected2, atol=1e-3)
@@ -0,0 +1,45 @@
+import numpy as np
+import cv2
+import ipcv
+
+
+def test_array_parameters_are_keyed_by_value():
+	src = np.zeros( (48,64), dtype=np.uint8 )
+	M1 = cv2.getRotationMatrix2D( (32,24), 10, 1.0 )
+	M2 = cv2.getRotationMatrix2D( (32,24), 20, 1.0 )
+
+	cache = ipcv.WarpMapCache()
+	a = cache.maps(ipcv.map_rotation_scale, src, matrix=M1)
+	b = cache.maps(ipcv.map_rotation_scale, src, matrix=M2)
+	assert len(cache) == 2
+	assert a[0] is not b[0]
+	assert not np.array_equal(a[0], b[0])
+
+	again = cache.maps(ipcv.map_rotation_scale, src, matrix=M1.copy())
+	assert again[0] is a[0]
+	assert len(cache) == 2
+
+
+def test_quad_arrays_are_keyed_by_value():
+	src = np.zeros( (48,64), dtype=np.uint8 )
+	corners = np.array( [0,63,63,0], dtype=np.float64 ), np.array( [0,0,47,47], dtype=np.float64 )
+	shifted = corners[0] + 5, corners[1]
+
+	cache = ipcv.WarpMapCache()
+	a = cache.maps(ipcv.map_quad_to_quad, src, src, corners[0], corners[1], *corners)
+	b = cache.maps(ipcv.map_quad_to_quad, src, src, shifted[0], shifted[1], *corners)
+	assert len(cache) == 2
+	assert not np.array_equal(a[0], b[0])
+
+
+def test_images_are_keyed_by_geometry():
+	src = np.zeros( (480,640), dtype=np.uint8 )
+	target = np.zeros( (480,640), dtype=np.uint8 )
+	corners = [0,639,639,0], [0,0,479,479]
+
+	cache = ipcv.WarpMapCache()
+	a = cache.maps(ipcv.map_quad_to_quad, src, target, *(corners * 2))
+	target[...] = 255
+	b = cache.maps(ipcv.map_quad_to_quad, src, target, *(corners * 2))
+	assert len(cache) == 1
+	assert a[0] is b[0]
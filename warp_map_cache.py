@@ -0,0 +1,109 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import ipcv
+
+# arrays up to this size are transform parameters keyed by value, larger
+# arrays are images keyed by their geometry
+_PARAMETER_BYTES = 1 << 16
+
+
+def _freeze(value):
+	"""
+	hashable form of a map function argument, small arrays (matrices,
+	corner and control point arrays) are keyed by a digest of their bytes,
+	images only by their shape and dtype
+	"""
+	if isinstance(value, np.ndarray):
+		if value.nbytes > _PARAMETER_BYTES:
+			return ("ndarray", value.shape, value.dtype.str)
+		digest = hashlib.sha1(np.ascontiguousarray(value).view(np.uint8)).hexdigest()
+		return ("ndarray", value.shape, value.dtype.str, digest)
+	if isinstance(value, (list, tuple)):
+		return tuple(_freeze(v) for v in value)
+	if isinstance(value, dict):
+		return tuple( sorted( (k, _freeze(v)) for k, v in value.items() ) )
+	return value
+
+
+class WarpMapCache(object):
+	"""
+	:purpose:
+		builds remap maps once and keeps them, in the compact fixed-point
+		format of ipcv.convert_maps, for repeated geometric transforms
+		(e.g. rectifying every frame of a fixed camera)
+
+		maps are keyed by the map function, the shape of the source image
+		and the values of the transform parameters (numbers, lists, tuples
+		or arrays of up to 64 KiB), larger arrays such as the target image
+		of ipcv.map_quad_to_quad are keyed by their shape and dtype only,
+		which is all that the map functions read from them, so the pixels
+		of the images are never looked at
+
+		the returned maps are read only and feed ipcv.remap directly
+	:inputs:
+		maxMaps [int]
+			'--> number of map pairs kept before the least recently used
+				 pair is released
+	"""
+
+	def __init__(self, maxMaps=8):
+		self._maxMaps = maxMaps
+		self._maps = OrderedDict()
+		self._lock = threading.Lock()
+
+	def maps(self, mapFunction, src, *args, **kwargs):
+		"""
+		:purpose:
+			returns the cached fixed-point (map1, map2) of
+			mapFunction(src, *args, **kwargs), building them on the first
+			request only
+		:inputs:
+			mapFunction [callable]
+				'--> function returning float (map1, map2), such as
+					 ipcv.map_rotation_scale or ipcv.map_quad_to_quad
+			src [np.ndarray]
+				'--> source image
+			nearest [bool]
+				'--> (keyword) keep integer coordinates only, for
+					 ipcv.INTER_NEAREST (map2 is then None)
+			*args, **kwargs
+				'--> transform parameters passed on to mapFunction
+		:return:
+			map1 [np.ndarray] (int16, rows x cols x 2),
+			map2 [np.ndarray] (uint16, rows x cols) or None
+		"""
+		nearest = kwargs.pop("nearest", False)
+		key = (mapFunction, src.shape, _freeze(args), _freeze(kwargs), bool(nearest))
+		with self._lock:
+			maps = self._maps.get(key)
+			if maps is not None:
+				self._maps.move_to_end(key)
+				return maps
+
+		map1, map2 = mapFunction(src, *args, **kwargs)
+		map1, map2 = ipcv.convert_maps(np.asarray(map1), None if map2 is None else np.asarray(map2), nearest)
+		for m in (map1, map2):
+			if m is not None:
+				m.setflags(write=False)
+
+		with self._lock:
+			self._maps[key] = (map1, map2)
+			while len(self._maps) > self._maxMaps:
+				self._maps.popitem(last=False)
+		return map1, map2
+
+	def clear(self):
+		"""
+		releases every cached map
+		"""
+		with self._lock:
+			self._maps.clear()
+
+	@property
+	def nbytes(self):
+		return sum(m.nbytes for maps in self._maps.values() for m in maps if m is not None)
+
+	def __len__(self):
+		return len(self._maps)
@@ -0,0 +1,62 @@
+from collections import OrderedDict
+import numpy as np
+
+
+class Workspace(object):
+	"""
+	:purpose:
+		owns reusable scratch buffers for the filtering and enhancement
+		routines so that repeated calls on frames of the same shape do not
+		allocate any new full-frame arrays
+
+		buffers are keyed by (name, shape, dtype), the name distinguishes
+		buffers of identical geometry that are needed at the same time
+	:inputs:
+		maxBuffers [int, None]
+			'--> the least recently used buffers are released once more
+				 than this many are held (None holds all of them)
+	"""
+
+	def __init__(self, maxBuffers=None):
+		self._buffers = OrderedDict()
+		self._maxBuffers = maxBuffers
+
+	def buffer(self, name, shape, dtype=np.float64):
+		"""
+		:purpose:
+			returns the scratch buffer for the given key, allocating it
+			on first use (the contents are undefined)
+		:inputs:
+			name [str]
+				'--> identifier of the buffer
+			shape [tuple]
+				'--> buffer shape
+			dtype [numpy.dtype]
+				'--> buffer dtype
+		:return:
+			buffer [np.ndarray]
+		"""
+		key = (name, tuple(shape), np.dtype(dtype))
+		buf = self._buffers.get(key)
+		if buf is None:
+			buf = np.empty(key[1], dtype=key[2])
+			self._buffers[key] = buf
+			if self._maxBuffers is not None:
+				while len(self._buffers) > self._maxBuffers:
+					self._buffers.popitem(last=False)
+		else:
+			self._buffers.move_to_end(key)
+		return buf
+
+	def clear(self):
+		"""
+		releases every buffer held by the workspace
+		"""
+		self._buffers.clear()
+
+	@property
+	def nbytes(self):
+		return sum(buf.nbytes for buf in self._buffers.values())
+
+	def __len__(self):
+		return len(self._buffers)